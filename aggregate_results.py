@@ -0,0 +1,200 @@
+##### Results aggregator for the GLA
+# Collects the run records in a tree of results files into one wide table (CSV):
+# one row per run, with the run information and parameters first and then one column per constraint,
+# aligned by name, so that a run without some constraint just has an empty cell there.
+# (This replaces deprecated_scripts/csv_maker_original.py, which re-read the text results files with regexes.)
+# It reads the JSON-lines (.jsonl) files written by gla.write_results_record, as well as sweep.py results files,
+# anywhere under the results folder.
+# The files read so far, and how far, are kept in a state file next to the table,
+# so running it again only reads records added since (new files, or new lines at the end of old ones).
+#
+# Usage: python aggregate_results.py results_dir output.csv [--processes N] [--full]
+# (see python aggregate_results.py --help for the options)
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+
+import gla
+
+# Columns of sweep.py results that are not constraints
+sweep_result_columns = ['seed', 'num_of_data', 'change_counter', 'eval_num', 'eval_errors']
+
+##### Reading records ##########################################################
+
+# One table row and the constraints in it, for a gla results record or a sweep.py record
+def record_row(record):
+    if 'ranking_values' in record:
+        return (gla.results_row(record), list(record['ranking_values'].keys()))
+    row = dict(record['config'])
+    consts = []
+    for key, value in record['result'].items():
+        row[key] = value
+        if key not in sweep_result_columns and key not in record['config']:
+            consts.append(key)
+    return (row, consts)
+
+# Read the records of one file from offset (in bytes) on.
+# Only whole lines are read, so a record still being written is left for the next time.
+# Returns the file, the offset after the last whole line, the number of lines read, the rows and the constraints.
+def read_file(task):
+    root, rel_path, offset, line_number = task
+    rows = []
+    consts = []
+    results_file = open(os.path.join(root, rel_path), 'rb')
+    results_file.seek(offset)
+    for line in results_file:
+        if not line.endswith(b"\n"):
+            break
+        offset += len(line)
+        line_number += 1
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line.decode('utf-8'))
+        except ValueError:
+            continue
+        if not isinstance(record, dict) or ('ranking_values' not in record and 'result' not in record):
+            continue
+        row, record_consts = record_row(record)
+        row['source'] = rel_path
+        row['line'] = line_number
+        rows.append(row)
+        for const in record_consts:
+            if const not in consts:
+                consts.append(const)
+    results_file.close()
+    return (rel_path, offset, line_number, rows, consts)
+
+# Results files (.jsonl) under root, relative to it
+def find_results_files(root):
+    rel_paths = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith('.jsonl'):
+                rel_paths.append(os.path.relpath(os.path.join(dir_path, file_name), root))
+    return rel_paths
+
+##### The aggregated table #####################################################
+
+def state_path_of(output_path):
+    return output_path+'.state.json'
+
+# What has been aggregated into output_path so far: how far each file was read, the constraint columns,
+# and the number of rows in the table.
+# Returns None if there is no valid state (or no table), in which case the table is rebuilt from scratch.
+def read_state(output_path):
+    state_path = state_path_of(output_path)
+    if not os.path.exists(state_path) or not os.path.exists(output_path):
+        return None
+    try:
+        state_file = open(state_path, 'r')
+        state = json.load(state_file)
+        state_file.close()
+    except ValueError:
+        return None
+    if not isinstance(state, dict) or 'files' not in state or 'consts' not in state or 'rows' not in state:
+        return None
+    return state
+
+# Written to a temporary file first, like the table
+def write_state(state, output_path):
+    state_path = state_path_of(output_path)
+    temp_path = state_path+'.tmp'
+    state_file = open(temp_path, 'w')
+    json.dump(state, state_file)
+    state_file.close()
+    os.replace(temp_path, state_path)
+
+def read_table(output_path):
+    if not os.path.exists(output_path):
+        return []
+    table_file = open(output_path, 'r', newline='', encoding='utf-8')
+    rows = list(csv.DictReader(table_file))
+    table_file.close()
+    return rows
+
+# Write the rows with the run information columns first (in order of first appearance) and the constraints last.
+# Written to a temporary file first, so that an interruption never leaves a half-written table.
+def write_table(rows, consts, output_path):
+    columns = ['source', 'line']
+    for row in rows:
+        for column in row.keys():
+            if column not in columns and column not in consts:
+                columns.append(column)
+    columns = columns + consts
+    temp_path = output_path+'.tmp'
+    table_file = open(temp_path, 'w', newline='', encoding='utf-8')
+    writer = csv.DictWriter(table_file, fieldnames=columns, restval='')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    table_file.close()
+    os.replace(temp_path, output_path)
+
+# Add the records under root that are not in output_path yet (all of them if full is True,
+# or if there is no valid state for the table, so that no row is ever added twice),
+# reading the results files in parallel. Returns the number of rows added.
+def aggregate(root, output_path, processes=None, full=False):
+    state = None
+    if not full:
+        state = read_state(output_path)
+    if state is not None:
+        rows = read_table(output_path)
+        # A table written by a run that stopped before writing its state has more rows than the state knows of
+        if len(rows) != state['rows']:
+            state = None
+    if state is None:
+        state = {'files': {}, 'consts': [], 'rows': 0}
+        rows = []
+
+    tasks = []
+    for rel_path in find_results_files(root):
+        offset, line_number = state['files'].get(rel_path, (0, 0))
+        if os.path.getsize(os.path.join(root, rel_path)) > offset:
+            tasks.append((root, rel_path, offset, line_number))
+    if len(tasks) == 0:
+        return 0
+
+    if processes is None:
+        processes = os.cpu_count()
+    pool = multiprocessing.Pool(min(processes, len(tasks)))
+    try:
+        file_results = pool.map(read_file, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    consts = list(state['consts'])
+    num_added = 0
+    for rel_path, offset, line_number, file_rows, file_consts in file_results:
+        rows.extend(file_rows)
+        num_added += len(file_rows)
+        for const in file_consts:
+            if const not in consts:
+                consts.append(const)
+        state['files'][rel_path] = (offset, line_number)
+    state['consts'] = consts
+    state['rows'] = len(rows)
+
+    # The table is written before the state: if the run stops in between,
+    # the old state no longer matches the number of rows in the table, so the next run rebuilds both
+    write_table(rows, consts, output_path)
+    write_state(state, output_path)
+    return num_added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate GLA run records under a folder into one table.")
+    parser.add_argument('results_dir')
+    parser.add_argument('output', help="CSV file to write (and to add to, on later runs)")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--full', action='store_true', help="read every file again instead of only new records")
+    args = parser.parse_args()
+
+    num_added = aggregate(args.results_dir, args.output, args.processes, args.full)
+    print(str(num_added)+" runs added; table in "+args.output)
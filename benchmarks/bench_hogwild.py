@@ -0,0 +1,41 @@
+##### Serial vs. Hogwild-style parallel OT-GLA
+# Usage: python benchmarks/bench_hogwild.py grammar_file target_file [repeat] [processes ...]
+# Learns the target list (repeated `repeat` times, to make a large corpus) with do_learning
+# and with hogwild_learning for each number of processes, and reports wall-clock time, throughput,
+# the largest difference in final ranking value from the serial run, and the evaluation error rate.
+# Wall-clock time can only drop with more processes if there are that many cores.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import gla
+
+eval_num = 2000
+
+def report(label, learning_result, seconds, serial_const_dict):
+    errors = gla.eval_errors(learning_result, eval_num, print_bool=False)
+    rv_diff = max([abs(learning_result.const_dict[c] - serial_const_dict[c]) for c in serial_const_dict])
+    print(label.ljust(14)+str(round(seconds, 2)).rjust(8)+" s"
+          +str(round(learning_result.num_of_data/seconds)).rjust(10)+" tokens/s"
+          +str(round(rv_diff, 2)).rjust(8)+" max rv diff"
+          +str(round(len(errors)/eval_num, 4)).rjust(9)+" eval error rate")
+
+if __name__ == "__main__":
+    grammar_text = gla.grammar_string(sys.argv[1])
+    target_list = gla.read_and_rstrip(sys.argv[2])*(int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+    process_counts = [int(x) for x in sys.argv[4:]] or [1, 2, os.cpu_count()]
+    print(str(len(target_list))+" data, "+str(os.cpu_count())+" cores")
+
+    random.seed(0)
+    start = time.perf_counter()
+    serial = gla.learning(target_list, gla.grammar_init(grammar_text), print_bool=False)
+    report("serial", serial, time.perf_counter()-start, serial.const_dict)
+
+    for processes in process_counts:
+        random.seed(0)
+        start = time.perf_counter()
+        result = gla.hogwild_learning(target_list, gla.grammar_init(grammar_text), processes)
+        report("hogwild "+str(processes), result, time.perf_counter()-start, serial.const_dict)
@@ -0,0 +1,28 @@
+##### Import time of gla
+# Usage: python benchmarks/bench_import.py [repeats]
+# Imports gla in fresh interpreters (as every worker process of replicate.py, sweep.py or eval_pool.py does)
+# and reports the median wall time of the import, next to that of matplotlib.pyplot,
+# which gla only loads inside plot_results.
+
+import os
+import statistics
+import subprocess
+import sys
+
+repo_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+timing_code = "import sys, time; sys.path.insert(0, sys.argv[1]); start = time.perf_counter(); import {0}; print(time.perf_counter()-start)"
+
+def import_time(module, repeats):
+    times = []
+    for i in range(repeats):
+        output = subprocess.run([sys.executable, '-c', timing_code.format(module), repo_path], capture_output=True, text=True, check=True).stdout
+        times.append(float(output)*1000)
+    return statistics.median(times)
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    # The first import may compile gla.py; the timed ones then load the cached bytecode
+    import_time('gla', 1)
+    for module in ['gla', 'numpy', 'matplotlib.pyplot']:
+        print(module.ljust(20)+str(round(import_time(module, repeats), 1)).rjust(10)+" ms")
@@ -0,0 +1,38 @@
+##### Throughput and convergence of mini-batch vs. online RIP/OT-GLA
+# Usage: python benchmarks/bench_minibatch.py grammar_file target_file [batch] [minibatch_size ...]
+# Learns the same target list with batch_learnig_RIP (one token at a time)
+# and with minibatch_learning_RIP for each mini-batch size,
+# and reports tokens per second and the evaluation error rate of the learned grammar.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import gla
+
+eval_num = 2000
+
+def report(label, learning_result, seconds):
+    errors = gla.eval_errors_RIP(learning_result, eval_num, print_bool=False)
+    print(label.ljust(20)+str(round(learning_result.num_of_data/seconds)).rjust(12)+" tokens/s"
+          +str(learning_result.change_counter).rjust(10)+" changes"
+          +str(round(len(errors)/eval_num, 4)).rjust(10)+" eval error rate")
+
+if __name__ == "__main__":
+    grammar_text = gla.grammar_string(sys.argv[1])
+    target_list = gla.read_and_rstrip(sys.argv[2])
+    batch = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    minibatch_sizes = [int(x) for x in sys.argv[4:]] or [8, 32, 128]
+
+    random.seed(0)
+    start = time.perf_counter()
+    result = gla.batch_learnig_RIP(target_list, gla.grammar_init_RIP(grammar_text), batch, print_bool=False)
+    report("online", result, time.perf_counter()-start)
+
+    for minibatch_size in minibatch_sizes:
+        random.seed(0)
+        start = time.perf_counter()
+        result = gla.minibatch_learning_RIP(target_list, gla.grammar_init_RIP(grammar_text), batch, minibatch_size, print_bool=False, seed=0)
+        report("minibatch "+str(minibatch_size), result, time.perf_counter()-start)
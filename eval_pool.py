@@ -0,0 +1,144 @@
+##### Parallel evaluation of learned grammars
+# Evaluates many learned grammars (e.g. the final ranking values of all the runs of a sweep)
+# in a pool of worker processes, instead of calling eval_errors/eval_errors_RIP on each of them in turn.
+# Each worker parses the grammar and reads the target file once, when it starts (with replicate.init_worker);
+# a task is then just a set of ranking values and a number of evaluations to make with them.
+# Workers send back confusion counts of the errors (see gla.confusion_counts), not printed strings.
+#
+# Usage: python eval_pool.py grammar_file target_file runs_file [options]
+# The runs file is a table from replicate.py (CSV) or a results file from sweep.py (JSON lines);
+# the output is the same table with the evaluation counts of each run added.
+# (see python eval_pool.py --help for the options)
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+
+import gla
+import replicate
+
+##### Worker processes #########################################################
+
+# What the evaluation functions of gla need to know about a learned grammar
+class learned_grammar:
+    def __init__(self, grammar, const_dict, target_list):
+        self.grammar = grammar
+        self.const_dict = const_dict
+        self.target_list = target_list
+
+# The target sampler of the worker's grammar and target list (see gla.learned_form_sampler),
+# made by its first task and used for all the others
+worker_form_sampler = None
+
+# Evaluate one block of num tokens with one set of ranking values.
+# Returns the index of the grammar, the number of evaluations, and the confusion counts of the errors.
+def eval_block(task):
+    global worker_form_sampler
+    grammar_index, const_dict, num, noise_sigma, seed = task
+    if replicate.worker_error is not None:
+        raise replicate.worker_error
+    random.seed(seed)
+    learning = learned_grammar(replicate.worker_grammar, const_dict, replicate.worker_target_list)
+    if worker_form_sampler is None:
+        worker_form_sampler = gla.learned_form_sampler(learning)
+    return (grammar_index, num, gla.eval_confusions(learning, num, noise_sigma, worker_form_sampler))
+
+##### The evaluation service ###################################################
+
+# A pool of evaluation workers that stays up for any number of evaluate calls.
+# Evaluation noise is that of gla.eval_noise_sigma, unless noise_sigma is given.
+class eval_service:
+    def __init__(self, grammar_file, target_file, is_RIP=False, processes=None, noise_sigma=None):
+        if processes is None:
+            processes = os.cpu_count()
+        self.noise_sigma = noise_sigma
+        self.pool = multiprocessing.Pool(processes, replicate.init_worker, (grammar_file, target_file, is_RIP))
+
+    # const_dicts is a list of learned ranking values (dictionaries from constraint to ranking value).
+    # Each is evaluated num times, in blocks of block_size tokens spread over the workers.
+    # Returns, for each const_dict in order, the number of evaluations and the confusion counts of the errors.
+    def evaluate(self, const_dicts, num=1000, block_size=1000):
+        tasks = []
+        for i in range(len(const_dicts)):
+            for start in range(0, num, block_size):
+                tasks.append((i, const_dicts[i], min(block_size, num-start), self.noise_sigma, random.getrandbits(64)))
+
+        results = [[0, gla.confusion_counts()] for i in range(len(const_dicts))]
+        for grammar_index, block_num, errors in self.pool.imap_unordered(eval_block, tasks):
+            results[grammar_index][0] += block_num
+            results[grammar_index][1].update(errors)
+        return [tuple(r) for r in results]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+# Evaluate the given learned ranking values once, with a pool that is shut down afterwards
+def evaluate_grammars(grammar_file, target_file, const_dicts, is_RIP=False, num=1000, block_size=1000, processes=None, noise_sigma=None):
+    service = eval_service(grammar_file, target_file, is_RIP, processes, noise_sigma)
+    try:
+        return service.evaluate(const_dicts, num, block_size)
+    finally:
+        service.close()
+
+##### Reading and writing tables of runs #######################################
+
+# The runs in a replicate.py table (.csv) or a sweep.py results file (JSON lines), as dictionaries
+def read_runs(runs_path):
+    runs = []
+    runs_file = open(runs_path, 'r', newline='')
+    if runs_path.endswith('.csv'):
+        for row in csv.DictReader(runs_file):
+            runs.append(row)
+    else:
+        for line in runs_file:
+            if line.strip():
+                record = json.loads(line)
+                run = dict(record['config'])
+                run.update(record['result'])
+                runs.append(run)
+    runs_file.close()
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the learned grammars of many runs in parallel.")
+    parser.add_argument('grammar_file')
+    parser.add_argument('target_file')
+    parser.add_argument('runs_file', help="table from replicate.py (.csv) or results file from sweep.py")
+    parser.add_argument('--rip', action='store_true', help="use RIP/OT-GLA (grammar_RIP)")
+    parser.add_argument('--eval-num', type=int, default=1000, help="number of evaluation samples per run")
+    parser.add_argument('--block-size', type=int, default=1000, help="number of evaluation samples per task")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--output', default='evaluations.csv')
+    args = parser.parse_args()
+
+    consts = list(gla.const_dict(gla.grammar_string(args.grammar_file), initiate=False).keys())
+    runs = read_runs(args.runs_file)
+    const_dicts = []
+    for run in runs:
+        const_dicts.append(dict([(const, float(run[const])) for const in consts]))
+
+    results = evaluate_grammars(args.grammar_file, args.target_file, const_dicts, args.rip, args.eval_num, args.block_size, args.processes)
+
+    rows = []
+    for i in range(len(runs)):
+        row = dict(runs[i])
+        row['eval_num'] = results[i][0]
+        row['eval_errors'] = results[i][1].total()
+        rows.append(row)
+    columns = []
+    for row in rows:
+        for column in row.keys():
+            if column not in columns:
+                columns.append(column)
+    output_file = open(args.output, 'w', newline='')
+    writer = csv.DictWriter(output_file, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    output_file.close()
+    print("Output file: "+args.output)
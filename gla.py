@@ -25,9 +25,17 @@ import random
 import sys
 import datetime
 import os
-import matplotlib.pyplot as plt
 import math
 import time
+import collections
+import copy
+import pickle
+import multiprocessing
+import itertools
+import bisect
+import json
+import statistics
+import hashlib
 
 #lang = sys.argv[1][:6]
 #syll_num = sys.argv[1][-9]
@@ -58,6 +66,571 @@ def read_and_rstrip(txtfile):
     target_file.close()
     return target_list
 
+# Target data can also be given compactly as a distribution of overt forms with their counts,
+# i.e. the "[overt]\tcount" files that learning_datum_maker/generate_learning_data.py expands
+# into `count` repeated lines. The learners accept a target_distribution wherever they accept a target list,
+# and draw its tokens one by one, so memory use depends on the number of types, not of tokens.
+distribution_pattern = re.compile(r"(.*\S)\t+(\d+)\s*$")
+
+def read_distribution(txtfile):
+    distribution_file = open(txtfile, 'r')
+    pairs = []
+    for line in distribution_file:
+        if line.strip() == '':
+            continue
+        match = re.match(distribution_pattern, line)
+        if not match:
+            raise ValueError("Line "+line.rstrip()+" is not of the form '[overt]<tab>count'. Please check distribution file.")
+        pairs.append((match.group(1), int(match.group(2))))
+    distribution_file.close()
+    return target_distribution(pairs)
+
+# Read a target file, which is either a binary target file (see target_tokens),
+# a distribution file, or a list of overt forms (one token per line).
+# If the grammar is given, a binary target file is checked against it and read as the grammar's target IDs.
+# (The tokens of other target files are checked as the learners come to them.)
+def read_targets(txtfile, grammar=None):
+    if txtfile.endswith('.npy'):
+        return target_tokens(txtfile[:-4], grammar)
+    target_file = open(txtfile, 'r')
+    first_line = target_file.readline()
+    target_file.close()
+    if re.match(distribution_pattern, first_line):
+        return read_distribution(txtfile)
+    else:
+        return read_and_rstrip(txtfile)
+
+class target_distribution:
+    # pairs is a list of (overt, count) tuples
+    def __init__(self, pairs):
+        self.types = []
+        self.counts = []
+        for overt, count in pairs:
+            if count < 0:
+                raise ValueError("Negative count for "+overt+".")
+            if count > 0:
+                self.types.append(overt)
+                self.counts.append(count)
+        if len(set(self.types)) != len(self.types):
+            raise ValueError("An overt form appears more than once in the distribution.")
+        self.total = sum(self.counts)
+
+    # Number of tokens
+    def __len__(self):
+        return self.total
+
+    # All tokens in a random order, like random.sample(target_list, len(target_list))
+    def shuffled(self):
+        return multiset_shuffler(self.types, self.counts)
+
+    # Split the tokens into num_shards distributions of (nearly) equal size
+    def split(self, num_shards):
+        shards = [[] for k in range(num_shards)]
+        offset = 0
+        for i in range(len(self.types)):
+            # The tokens of each type are dealt out in turn, continuing from where the previous type left off
+            for k in range(num_shards):
+                count = (self.counts[i] - (k - offset) % num_shards + num_shards - 1) // num_shards
+                shards[k].append((self.types[i], count))
+            offset = (offset + self.counts[i]) % num_shards
+        return [target_distribution(pairs) for pairs in shards]
+
+# Iterates over all tokens of a distribution in a uniformly random order without listing them:
+# each next token is drawn with probability proportional to the remaining count of its type.
+# The remaining counts are kept in a Fenwick (binary indexed) tree, so each draw takes O(log types) steps.
+# (It is a class rather than a generator so that it can be pickled in checkpoints.)
+class multiset_shuffler:
+    def __init__(self, types, counts):
+        self.types = types
+        self.remaining = sum(counts)
+        size = len(counts)
+        self.tree = [0]*(size+1)
+        for i in range(1, size+1):
+            self.tree[i] += counts[i-1]
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+        self.top_step = 1
+        while self.top_step*2 <= size:
+            self.top_step *= 2
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining == 0:
+            raise StopIteration
+        r = random.randrange(self.remaining)
+        # Find the type whose range of (remaining) tokens contains r
+        position = 0
+        step = self.top_step
+        while step > 0:
+            if position+step < len(self.tree) and self.tree[position+step] <= r:
+                position += step
+                r -= self.tree[position]
+            step //= 2
+        # Take one token of that type out
+        i = position+1
+        while i < len(self.tree):
+            self.tree[i] -= 1
+            i += i & -i
+        self.remaining -= 1
+        return self.types[position]
+
+# A target file (one token per line) can also be streamed instead of read into a list,
+# so that memory use stays flat however large the corpus is.
+# Opening the stream makes one pass through the file to count the tokens of each type;
+# the learners then read the file again for each pass through the data.
+# Since they need the data in random order, the tokens go through a shuffle buffer
+# (see buffered_shuffle); the larger buffer_size, the closer the order is to a full shuffle.
+class target_file_stream:
+    def __init__(self, txtfile, buffer_size=100000):
+        self.txtfile = txtfile
+        self.buffer_size = buffer_size
+        type_counts = collections.Counter()
+        target_file = open(txtfile, 'r')
+        for line in target_file:
+            token = line.rstrip()
+            if token:
+                type_counts[token] += 1
+        target_file.close()
+        self.types = list(type_counts.keys())
+        self.counts = list(type_counts.values())
+        self.total = sum(self.counts)
+
+    def __len__(self):
+        return self.total
+
+    def shuffled(self):
+        return buffered_shuffle(self.txtfile, self.buffer_size)
+
+# Reads the tokens of a file into a buffer of buffer_size tokens.
+# Once the buffer is full, each new token replaces a random token in the buffer, which is passed on;
+# at the end of the file, the rest of the buffer is passed on in random order.
+# (A class rather than a generator, so that it can be pickled in checkpoints:
+# only the buffer and the position in the file are kept.)
+class buffered_shuffle:
+    def __init__(self, txtfile, buffer_size):
+        self.txtfile = txtfile
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.file_position = 0
+        self.file_done = False
+        self.target_file = None
+
+    def __iter__(self):
+        return self
+
+    def read_token(self):
+        if self.target_file is None:
+            self.target_file = open(self.txtfile, 'rb')
+            self.target_file.seek(self.file_position)
+        while True:
+            line = self.target_file.readline()
+            if not line:
+                self.target_file.close()
+                self.target_file = None
+                self.file_done = True
+                return None
+            self.file_position += len(line)
+            token = line.decode('utf-8').rstrip()
+            if token:
+                return token
+
+    def __next__(self):
+        while not self.file_done:
+            token = self.read_token()
+            if token is None:
+                break
+            if len(self.buffer) < self.buffer_size:
+                self.buffer.append(token)
+            else:
+                i = random.randrange(self.buffer_size)
+                token_out = self.buffer[i]
+                self.buffer[i] = token
+                return token_out
+        if len(self.buffer) == 0:
+            raise StopIteration
+        i = random.randrange(len(self.buffer))
+        self.buffer[i], self.buffer[-1] = self.buffer[-1], self.buffer[i]
+        return self.buffer.pop()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['target_file'] = None
+        return state
+
+# Binary target files store the same data as a target list, but compactly:
+#   <stem>.vocab  the overt forms, one per line (the form on line i has ID i)
+#   <stem>.npy    the tokens as an array of IDs (uint16 if there are few enough types, uint32 otherwise)
+# They are written by the learning_datum_maker scripts, and memory-mapped by target_tokens,
+# so the tokens are never read into Python lists.
+def binary_target_paths(stem):
+    return (stem+'.vocab', stem+'.npy')
+
+# vocab is the list of overt forms; token_ids is a sequence of IDs into it
+def write_binary_targets(stem, vocab, token_ids):
+    import numpy as np
+    vocab_path, tokens_path = binary_target_paths(stem)
+    vocab_file = open(vocab_path, 'w', encoding='utf-8')
+    for overt in vocab:
+        vocab_file.write(overt+"\n")
+    vocab_file.close()
+    if len(vocab) <= np.iinfo(np.uint16).max+1:
+        dtype = np.uint16
+    else:
+        dtype = np.uint32
+    np.save(tokens_path, np.asarray(token_ids, dtype=dtype))
+
+class target_tokens:
+    # If a grammar is given, the file is checked against it up front (see grammar_id_map)
+    def __init__(self, stem, grammar=None, block_size=1000000):
+        import numpy as np
+        self.stem = stem
+        self.block_size = block_size
+        vocab_path, tokens_path = binary_target_paths(stem)
+        self.vocab = read_and_rstrip(vocab_path)
+        self.token_ids = np.load(tokens_path, mmap_mode='r')
+
+        # Count the tokens of each type, a block at a time
+        vocab_counts = np.zeros(len(self.vocab), dtype=np.int64)
+        for start in range(0, len(self.token_ids), block_size):
+            vocab_counts += np.bincount(self.token_ids[start:start+block_size], minlength=len(self.vocab))
+        self.type_vocab_ids = [i for i in range(len(self.vocab)) if vocab_counts[i] > 0]
+        self.types = [self.vocab[i] for i in self.type_vocab_ids]
+        self.counts = [int(vocab_counts[i]) for i in self.type_vocab_ids]
+        self.total = len(self.token_ids)
+
+        # The grammar whose target IDs grammar_ids holds (see grammar_id_map)
+        self.grammar_targets = None
+        self.grammar_ids = None
+        if grammar is not None:
+            self.grammar_id_map(grammar)
+
+    def __len__(self):
+        return self.total
+
+    # An array from the file's IDs to the grammar's target IDs (see intern_targets),
+    # made the first time it is needed for a grammar.
+    # Every overt form in the file must be a target of the grammar.
+    def grammar_id_map(self, grammar):
+        import numpy as np
+        if self.grammar_targets is not grammar.targets:
+            for overt in self.types:
+                if overt not in grammar.target_ids:
+                    raise ValueError(overt+" is not a target in this grammar.")
+            self.grammar_ids = np.array([grammar.target_ids.get(overt, -1) for overt in self.vocab], dtype=np.int64)
+            self.grammar_targets = grammar.targets
+        return self.grammar_ids
+
+    # All tokens in random order. Since only the counts of the types matter for this,
+    # it shuffles the counts (see multiset_shuffler) rather than the token array.
+    def shuffled(self):
+        return multiset_shuffler(self.types, self.counts)
+
+    # All tokens in the order of the file (e.g. when it was written in an already shuffled order)
+    def in_order(self):
+        return binary_token_reader(self.stem, self.vocab, self.block_size)
+
+    # The same as target IDs of the grammar, for the learners (see draw_target_ids)
+    def shuffled_ids(self, grammar):
+        id_map = self.grammar_id_map(grammar)
+        return multiset_shuffler([int(id_map[i]) for i in self.type_vocab_ids], self.counts)
+
+    def sampled_ids(self, grammar):
+        id_map = self.grammar_id_map(grammar)
+        return alias_sampler([int(id_map[i]) for i in self.type_vocab_ids], self.counts, self.total)
+
+    def in_order_ids(self, grammar):
+        return binary_token_reader(self.stem, self.vocab, self.block_size, self.grammar_id_map(grammar))
+
+# Reads the tokens of a binary target file in order, a block of IDs at a time.
+# The tokens are given as overt forms, or, if id_map is given, as the IDs it maps the file's IDs to.
+# (Pickled as its position in the file, for checkpoints.)
+class binary_token_reader:
+    def __init__(self, stem, vocab, block_size, id_map=None):
+        self.stem = stem
+        self.vocab = vocab
+        self.block_size = block_size
+        self.id_map = id_map
+        self.position = 0
+        self.block = []
+        self.block_position = 0
+        self.token_ids = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        import numpy as np
+        if self.block_position == len(self.block):
+            if self.token_ids is None:
+                self.token_ids = np.load(binary_target_paths(self.stem)[1], mmap_mode='r')
+            if self.position >= len(self.token_ids):
+                raise StopIteration
+            block = self.token_ids[self.position:self.position+self.block_size]
+            if self.id_map is not None:
+                block = self.id_map[block]
+            self.block = block.tolist()
+            self.block_position = 0
+            self.position += len(self.block)
+        self.block_position += 1
+        if self.id_map is not None:
+            return self.block[self.block_position-1]
+        return self.vocab[self.block[self.block_position-1]]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['token_ids'] = None
+        return state
+
+# Goes through the tokens of a target list in order, or in a random order given by a seed.
+# (Pickled for checkpoints as the seed and the position only: the list and the order are left out,
+# and the learner gives the list back with attach when it resumes; the order is then drawn again from the seed.)
+class list_tokens:
+    def __init__(self, target_list, shuffle=True):
+        if shuffle:
+            self.seed = random.getrandbits(64)
+        else:
+            self.seed = None
+        self.position = 0
+        self.attach(target_list)
+
+    def attach(self, target_list):
+        self.target_list = target_list
+        self.order = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        import numpy as np
+        if self.position >= len(self.target_list):
+            raise StopIteration
+        if self.seed is None:
+            t = self.target_list[self.position]
+        else:
+            if self.order is None:
+                self.order = np.random.default_rng(self.seed).permutation(len(self.target_list))
+            t = self.target_list[self.order[self.position]]
+        self.position += 1
+        return t
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['target_list'] = None
+        state['order'] = None
+        return state
+
+# Helpers for the learners, which accept target lists as well as
+# target_distribution, target_file_stream and target_tokens objects
+def shuffle_targets(target_list):
+    if isinstance(target_list, list):
+        return list_tokens(target_list)
+    else:
+        return target_list.shuffled()
+
+def target_type_set(target_list):
+    if isinstance(target_list, list):
+        return set(target_list)
+    else:
+        return set(target_list.types)
+
+# The target types, in the order they first appear (their position in this list is their type ID)
+def target_types(target_list):
+    if isinstance(target_list, list):
+        return list(dict.fromkeys(target_list))
+    else:
+        return list(target_list.types)
+
+# Number of tokens of each target type that were learned (generated correctly) and failed (generated wrongly),
+# kept in lists indexed by type ID, so that their size does not grow with the amount of data
+class type_counters:
+    def __init__(self, types, learned=None, failed=None):
+        self.types = list(types)
+        self.type_ids = {}
+        for i in range(len(self.types)):
+            self.type_ids[self.types[i]] = i
+        if learned is None:
+            learned = [0]*len(self.types)
+        if failed is None:
+            failed = [0]*len(self.types)
+        self.learned = [int(n) for n in learned]
+        self.failed = [int(n) for n in failed]
+
+    # ID of a type, which is given the next ID if it is new
+    def type_id(self, t):
+        if t not in self.type_ids:
+            self.type_ids[t] = len(self.types)
+            self.types.append(t)
+            self.learned.append(0)
+            self.failed.append(0)
+        return self.type_ids[t]
+
+    def record(self, t, learned_bool):
+        self.record_id(self.type_id(t), learned_bool)
+
+    def record_id(self, type_id, learned_bool):
+        if learned_bool:
+            self.learned[type_id] += 1
+        else:
+            self.failed[type_id] += 1
+
+    # Add the counts of another type_counters (e.g. from another worker)
+    def update(self, other):
+        for i in range(len(other.types)):
+            type_id = self.type_id(other.types[i])
+            self.learned[type_id] += other.learned[i]
+            self.failed[type_id] += other.failed[i]
+
+    # The counts of the given types only, in that order
+    # (the learners count by the grammar's target IDs, and keep only the types of their target data at the end)
+    def subset(self, types):
+        type_ids = [self.type_id(t) for t in types]
+        return type_counters(types, [self.learned[i] for i in type_ids], [self.failed[i] for i in type_ids])
+
+    # Types that were never learned
+    def failed_set(self):
+        return set([self.types[i] for i in range(len(self.types)) if self.learned[i] == 0])
+
+    # Proportion of the tokens of each type that were generated wrongly during learning
+    # (types that never came up during learning are left out)
+    def error_rates(self):
+        rates = {}
+        for i in range(len(self.types)):
+            seen = self.learned[i] + self.failed[i]
+            if seen > 0:
+                rates[self.types[i]] = self.failed[i]/seen
+        return rates
+
+# Independent random draws of tokens, with each type drawn in proportion to its count,
+# using Walker's alias method: the tables are built once in O(types),
+# after which each draw takes one uniform integer and one uniform number, whatever the number of types.
+# Draws are made with numpy in blocks of block_size, and handed out one at a time.
+# If num is given, the sampler is an iterator over num draws; otherwise it never runs out.
+# The numpy generator is seeded from the random module, so random.seed makes the draws reproducible.
+class alias_sampler:
+    def __init__(self, types, counts, num=None, block_size=4096):
+        import numpy as np
+        if len(types) == 0 or sum(counts) <= 0:
+            raise ValueError("Cannot sample from an empty distribution.")
+        self.types = list(types)
+        self.remaining = num
+        self.block_size = block_size
+        self.rng = np.random.default_rng(random.getrandbits(64))
+
+        # Vose's construction: scale probabilities so that their mean is 1,
+        # then pair each type below 1 with one above 1 that fills up the rest of its column.
+        size = len(self.types)
+        total = float(sum(counts))
+        scaled = [count*size/total for count in counts]
+        self.prob = np.ones(size)
+        self.alias = np.arange(size)
+        small = [i for i in range(size) if scaled[i] < 1.0]
+        large = [i for i in range(size) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Whatever is left over has probability 1 (up to rounding errors)
+
+        self.block = []
+        self.position = 0
+
+    # Draw k type ids at once
+    def draw_ids(self, k):
+        import numpy as np
+        columns = self.rng.integers(len(self.types), size=k)
+        coins = self.rng.random(k)
+        return np.where(coins < self.prob[columns], columns, self.alias[columns])
+
+    def draw(self):
+        if self.position == len(self.block):
+            self.block = self.draw_ids(self.block_size).tolist()
+            self.position = 0
+        self.position += 1
+        return self.types[self.block[self.position-1]]
+
+    # k tokens at once
+    def sample(self, k):
+        return [self.types[i] for i in self.draw_ids(k).tolist()]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.remaining is not None:
+            if self.remaining == 0:
+                raise StopIteration
+            self.remaining -= 1
+        return self.draw()
+
+def target_sampler(target_list, num=None):
+    if isinstance(target_list, list):
+        type_counts = collections.Counter(target_list)
+        return alias_sampler(list(type_counts.keys()), list(type_counts.values()), num)
+    else:
+        return alias_sampler(target_list.types, target_list.counts, num)
+
+# The order in which a learner goes through the target data:
+# 'shuffle' takes every token once, in random order; 'iid' takes as many tokens, drawn independently at random;
+# 'in_order' takes every token once, in the order of the target list (or binary target file).
+def draw_targets(target_list, draw='shuffle'):
+    if draw == 'shuffle':
+        return shuffle_targets(target_list)
+    elif draw == 'iid':
+        return target_sampler(target_list, len(target_list))
+    elif draw == 'in_order':
+        if isinstance(target_list, list):
+            return list_tokens(target_list, shuffle=False)
+        elif isinstance(target_list, target_tokens):
+            return target_list.in_order()
+        else:
+            raise ValueError("Only target lists and binary target files can be learned in order.")
+    else:
+        raise ValueError("Unknown draw "+str(draw)+". It should be 'shuffle', 'iid' or 'in_order'.")
+
+# The learners go through the target data as target IDs of their grammar (see intern_targets).
+# A binary target file is drawn from as IDs directly; other target data are drawn as overt forms
+# (see draw_targets), which are then looked up one at a time (see interned_targets).
+def draw_target_ids(target_list, grammar, draw='shuffle'):
+    if isinstance(target_list, target_tokens):
+        if draw == 'shuffle':
+            return target_list.shuffled_ids(grammar)
+        elif draw == 'iid':
+            return target_list.sampled_ids(grammar)
+        elif draw == 'in_order':
+            return target_list.in_order_ids(grammar)
+    return interned_targets(draw_targets(target_list, draw), grammar.target_ids)
+
+# Turns a stream of overt forms into a stream of target IDs
+# (A class rather than a generator, so that it can be pickled in checkpoints.)
+class interned_targets:
+    def __init__(self, target_stream, target_ids):
+        self.target_stream = target_stream
+        self.target_ids = target_ids
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        t = next(self.target_stream)
+        try:
+            return self.target_ids[t]
+        except KeyError:
+            raise ValueError(t+" is not a target in this grammar.")
+
+    # See list_tokens
+    def attach(self, target_list):
+        if hasattr(self.target_stream, 'attach'):
+            self.target_stream.attach(target_list)
+
 ##### Part 1: Extract Information from Grammar File ############################
 
 # Praat's otgrammar file is a list of constraints followed by a list of OT tableaux, 
@@ -320,10 +893,35 @@ def const_dict(grammar_string, initiate=True, init_value=None):
             const_dict[str(const[0])] = float(const[1])
     return const_dict
 
+# Number the possible targets (overt forms) of a grammar, in the order they appear in the grammar file:
+# the candidates for an ordinary grammar, and the overt forms of the candidates for an RIP grammar.
+# Returns the list of targets, a dictionary from target to its number (ID),
+# and the list of the input of each target (as find_input or make_input would give it),
+# so that the learners can look up everything about a datum by its ID.
+def intern_targets(i2o_tableaux, is_RIP=False):
+    targets = []
+    target_ids = {}
+    target_inputs = []
+    for inp in i2o_tableaux.keys():
+        for cand in i2o_tableaux[inp].keys():
+            if is_RIP:
+                # The candidates of an RIP i2o tableau are (overt, parse) tuples
+                cand = cand[0]
+            if cand not in target_ids:
+                target_ids[cand] = len(targets)
+                targets.append(cand)
+                if is_RIP:
+                    target_inputs.append(make_input(cand))
+                else:
+                    target_inputs.append(inp)
+    return (targets, target_ids, target_inputs)
+
 class grammar:
     def __init__(self, grammar_string):
         self.i2o_tableaux = build_tableaux(grammar_string)
         self.const_dict = const_dict(grammar_string, initiate=False)
+        self.targets, self.target_ids, self.target_inputs = intern_targets(self.i2o_tableaux)
+        self.compiled_tableaux = {}
 
 class grammar_RIP:
     def __init__(self, grammar_string):
@@ -331,11 +929,15 @@ class grammar_RIP:
         self.o2p_tableaux = build_tableaux_RIP_o2p(grammar_string)
         self.i2o_tableaux = build_tableaux_RIP_i2o(grammar_string)
         self.const_dict = const_dict(grammar_string, initiate=False)
+        self.targets, self.target_ids, self.target_inputs = intern_targets(self.i2o_tableaux, True)
+        self.compiled_tableaux = {}
 
 class grammar_init:
     def __init__(self, grammar_string, init_value=100):
         self.i2o_tableaux = build_tableaux(grammar_string)
         self.const_dict = const_dict(grammar_string, True, init_value)
+        self.targets, self.target_ids, self.target_inputs = intern_targets(self.i2o_tableaux)
+        self.compiled_tableaux = {}
 
 class grammar_init_RIP:
     def __init__(self, grammar_string, init_value=100):
@@ -343,6 +945,21 @@ class grammar_init_RIP:
         self.o2p_tableaux = build_tableaux_RIP_o2p(grammar_string)
         self.i2o_tableaux = build_tableaux_RIP_i2o(grammar_string)
         self.const_dict = const_dict(grammar_string, True, init_value)
+        self.targets, self.target_ids, self.target_inputs = intern_targets(self.i2o_tableaux, True)
+        self.compiled_tableaux = {}
+
+# A copy of a grammar that shares its tableaux (which are never changed)
+# but has its own const_dict (which learning changes in place).
+# If init_value is given, all ranking values of the copy are set to it, as in grammar_init.
+def copy_grammar(grammar, init_value=None):
+    grammar_copy = copy.copy(grammar)
+    grammar_copy.const_dict = {}
+    for const in grammar.const_dict.keys():
+        if init_value is None:
+            grammar_copy.const_dict[const] = grammar.const_dict[const]
+        else:
+            grammar_copy.const_dict[const] = float(init_value)
+    return grammar_copy
 
 ##### Part 2: Defining utility functions #######################################
 def find_input(overt_string, input_tableaux):
@@ -496,84 +1113,550 @@ def learn(winner_viol_profile, loser_viol_profile, const_dict, plasticity):
     return adjust_grammar(good_consts, bad_consts, const_dict, plasticity)
 
 
-def do_learning(target_list, grammar, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
+# Vectorized EVAL, for running many evaluations at once with numpy.
+# The tableaux are compiled into an array of violations (tableaux x candidates x constraints).
+# Tableaux with fewer candidates are padded with candidates that violate every constraint
+# more than any real candidate does, so that they never win.
+class tableau_array:
+    def __init__(self, tableaux, consts):
+        import numpy as np
+        self.consts = list(consts)
+        self.keys = list(tableaux.keys())
+        self.key_ids = {}
+        for i in range(len(self.keys)):
+            self.key_ids[self.keys[i]] = i
+        self.cands = [list(tableaux[key].keys()) for key in self.keys]
+        self.cand_ids = []
+        for cands in self.cands:
+            cand_ids = {}
+            for j in range(len(cands)):
+                cand_ids[cands[j]] = j
+            self.cand_ids.append(cand_ids)
+
+        max_cands = max([len(cands) for cands in self.cands])
+        self.pad_viol = np.iinfo(np.int32).max
+        self.viols = np.full((len(self.keys), max_cands, len(self.consts)), self.pad_viol, dtype=np.int32)
+        for i in range(len(self.keys)):
+            for j in range(len(self.cands[i])):
+                viol_profile = tableaux[self.keys[i]][self.cands[i][j]]
+                self.viols[i, j] = [viol_profile[const] for const in self.consts]
+
+    # Evaluations are processed this many at a time, so that the gathered violations
+    # (chunk x candidates x constraints) stay small however many evaluations are asked for
+    chunk_size = 4096
+
+    # ranking_values: (evaluations x constraints) array of (noisy) ranking values, one row per evaluation.
+    # key_ids: tableau id of each evaluation, or a single tableau id for all of them.
+    # Returns the id of the winning candidate of each evaluation.
+    def winners(self, ranking_values, key_ids, rng=None):
+        import numpy as np
+        if rng is None:
+            rng = np.random.default_rng()
+        num_evals = ranking_values.shape[0]
+        # Order constraints from highest to lowest ranking value,
+        # breaking ties at random (as ranking does)
+        tie_breaker = rng.random(ranking_values.shape)
+        ranked_consts = np.lexsort((tie_breaker, -ranking_values), axis=-1)
+        key_ids = np.broadcast_to(key_ids, (num_evals,))
+
+        winner_ids = np.empty(num_evals, dtype=np.intp)
+        for start in range(0, num_evals, self.chunk_size):
+            end = min(start+self.chunk_size, num_evals)
+            viols = self.viols[key_ids[start:end]]
+            ranked_viols = np.take_along_axis(viols, ranked_consts[start:end, None, :], axis=2)
+
+            # Go down the ranking, keeping only the candidates with the fewest violations of each constraint
+            alive = np.ones(viols.shape[:2], dtype=bool)
+            for c in range(ranked_viols.shape[2]):
+                column = np.where(alive, ranked_viols[:, :, c], self.pad_viol)
+                alive &= column == column.min(axis=1, keepdims=True)
+                if (alive.sum(axis=1) == 1).all():
+                    break
+            # If candidates are still tied after all constraints, the first one wins
+            winner_ids[start:end] = alive.argmax(axis=1)
+        return winner_ids
+
+##### Part 3: Learning #########################################################
+
+# The learners keep three trajectories for plotting:
+# the ranking value of each constraint after each datum (ranking_value_tracks),
+# the number of learned tokens after each datum (learning_track),
+# and the datum numbers where the grammar changed (interval_track).
+# By default they are kept in Python lists.
+class memory_tracks:
+    def __init__(self, consts):
+        self.ranking_value_tracks = {}
+        for const in consts:
+            self.ranking_value_tracks[const] = []
+        self.learning_track = []
+        self.interval_track = []
+
+    def record(self, const_dict, learned_count):
+        for const in self.ranking_value_tracks.keys():
+            self.ranking_value_tracks[const].append(const_dict[const])
+        self.learning_track.append(learned_count)
+
+    def record_change(self, datum_counter):
+        self.interval_track.append(datum_counter)
+
+    def close(self):
+        return (self.ranking_value_tracks, self.learning_track, self.interval_track)
+
+# For very long runs, the trajectories can instead be streamed to .npy files on disk.
+# The files are preallocated memory-mapped arrays, filled in chunks:
+#   <track_path>_rvs.npy       (data x constraints) ranking values
+#   <track_path>_learning.npy  number of learned tokens
+#   <track_path>_intervals.npy datum numbers where the grammar changed
+#   <track_path>_consts.txt    constraint names, in the column order of _rvs.npy
+# If more data come in than were preallocated, the files are grown in place,
+# and they are trimmed to the actual number of data when the run is closed.
+# numpy is only needed for this (and other array-based features), so it is imported where used.
+def track_file_paths(track_path):
+    return (track_path+'_rvs.npy', track_path+'_learning.npy', track_path+'_intervals.npy', track_path+'_consts.txt')
+
+# Written when the trajectories are complete (by mmap_tracks.close),
+# so that other processes (e.g. plot_pool.py) know that they can be read
+def track_done_path(track_path):
+    return track_path+'_done.txt'
+
+# Change the length (first axis) of an .npy file in place, by rewriting its header
+# and truncating or extending the data that follow it.
+def resize_npy(npy_path, length):
+    import numpy as np
+    import io
+    with open(npy_path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        header_length = f.tell()
+        new_shape = (length,) + tuple(shape[1:])
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order, 'shape': new_shape}
+        header_buffer = io.BytesIO()
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header_buffer, header)
+        else:
+            np.lib.format.write_array_header_2_0(header_buffer, header)
+        # numpy leaves spare room in the header for exactly this, so the header length should not change
+        if len(header_buffer.getvalue()) != header_length:
+            raise ValueError("Cannot resize "+npy_path+" in place.")
+        f.seek(0)
+        f.write(header_buffer.getvalue())
+        row_size = dtype.itemsize
+        for dim in shape[1:]:
+            row_size *= dim
+        f.truncate(header_length + length*row_size)
+
+class mmap_tracks:
+    def __init__(self, consts, track_path, capacity, chunk_size=4096):
+        import numpy as np
+        self.consts = list(consts)
+        self.track_path = track_path
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        rvs_path, learning_path, intervals_path, consts_path = track_file_paths(track_path)
+        if os.path.exists(track_done_path(track_path)):
+            os.remove(track_done_path(track_path))
+
+        consts_file = open(consts_path, 'w')
+        for const in self.consts:
+            consts_file.write(const+"\n")
+        consts_file.close()
+
+        self.rvs = np.lib.format.open_memmap(rvs_path, 'w+', np.float64, (self.capacity, len(self.consts)))
+        self.learning = np.lib.format.open_memmap(learning_path, 'w+', np.int64, (self.capacity,))
+        self.intervals = np.lib.format.open_memmap(intervals_path, 'w+', np.int64, (self.capacity,))
+
+        # Number of rows already written to the memory-mapped files
+        self.data_written = 0
+        self.changes_written = 0
+        # Rows waiting to be written in the next chunk
+        self.rv_buffer = []
+        self.learning_buffer = []
+        self.interval_buffer = []
+
+    def record(self, const_dict, learned_count):
+        self.rv_buffer.append([const_dict[const] for const in self.consts])
+        self.learning_buffer.append(learned_count)
+        if len(self.rv_buffer) >= self.chunk_size:
+            self.flush()
+
+    def record_change(self, datum_counter):
+        self.interval_buffer.append(datum_counter)
+
+    # Grow the files so that they can hold at least `needed` rows
+    def grow(self, needed):
+        import numpy as np
+        new_capacity = max(needed, 2*self.capacity)
+        self.rvs.flush()
+        self.learning.flush()
+        self.intervals.flush()
+        # The arrays must be unmapped before their files can be resized
+        del self.rvs, self.learning, self.intervals
+        rvs_path, learning_path, intervals_path, consts_path = track_file_paths(self.track_path)
+        for npy_path in (rvs_path, learning_path, intervals_path):
+            resize_npy(npy_path, new_capacity)
+        self.rvs = np.load(rvs_path, mmap_mode='r+')
+        self.learning = np.load(learning_path, mmap_mode='r+')
+        self.intervals = np.load(intervals_path, mmap_mode='r+')
+        self.capacity = new_capacity
+
+    def flush(self):
+        needed = max(self.data_written + len(self.rv_buffer), self.changes_written + len(self.interval_buffer))
+        if needed > self.capacity:
+            self.grow(needed)
+        if len(self.rv_buffer) > 0:
+            self.rvs[self.data_written:self.data_written+len(self.rv_buffer)] = self.rv_buffer
+            self.learning[self.data_written:self.data_written+len(self.learning_buffer)] = self.learning_buffer
+            self.data_written += len(self.rv_buffer)
+        if len(self.interval_buffer) > 0:
+            self.intervals[self.changes_written:self.changes_written+len(self.interval_buffer)] = self.interval_buffer
+            self.changes_written += len(self.interval_buffer)
+        self.rv_buffer = []
+        self.learning_buffer = []
+        self.interval_buffer = []
+
+    # For checkpoints: pickling writes out the buffered rows and keeps only the file positions,
+    # and unpickling reopens the files where they were left.
+    def __getstate__(self):
+        self.flush()
+        self.rvs.flush()
+        self.learning.flush()
+        self.intervals.flush()
+        state = self.__dict__.copy()
+        del state['rvs'], state['learning'], state['intervals']
+        return state
+
+    def __setstate__(self, state):
+        import numpy as np
+        self.__dict__.update(state)
+        rvs_path, learning_path, intervals_path, consts_path = track_file_paths(self.track_path)
+        self.rvs = np.load(rvs_path, mmap_mode='r+')
+        self.learning = np.load(learning_path, mmap_mode='r+')
+        self.intervals = np.load(intervals_path, mmap_mode='r+')
+
+    # Write out the last chunk, trim the files to their actual length,
+    # and reopen them read-only.
+    def close(self):
+        self.flush()
+        self.rvs.flush()
+        self.learning.flush()
+        self.intervals.flush()
+        del self.rvs, self.learning, self.intervals
+        rvs_path, learning_path, intervals_path, consts_path = track_file_paths(self.track_path)
+        resize_npy(rvs_path, self.data_written)
+        resize_npy(learning_path, self.data_written)
+        resize_npy(intervals_path, self.changes_written)
+        done_file = open(track_done_path(self.track_path), 'w')
+        done_file.write(str(self.data_written)+"\n")
+        done_file.close()
+        return load_tracks(self.track_path)
+
+def make_tracks(consts, track_path=None, capacity=0):
+    if track_path is None:
+        return memory_tracks(consts)
+    else:
+        return mmap_tracks(consts, track_path, capacity)
+
+# Read trajectories written with track_path back, without loading them into memory.
+# The ranking value track of each constraint is a (memory-mapped) column of the _rvs.npy array.
+def load_tracks(track_path):
+    import numpy as np
+    rvs_path, learning_path, intervals_path, consts_path = track_file_paths(track_path)
+    consts = read_and_rstrip(consts_path)
+
+    rvs = np.load(rvs_path, mmap_mode='r')
+    learning_track = np.load(learning_path, mmap_mode='r')
+    interval_track = np.load(intervals_path, mmap_mode='r')
+
+    ranking_value_tracks = {}
+    for i in range(len(consts)):
+        ranking_value_tracks[consts[i]] = rvs[:, i]
+    return (ranking_value_tracks, learning_track, interval_track)
+
+
+# Plasticity and noise_sigma can be fixed numbers, or schedules that change them over the course of learning.
+# A schedule gives a value for each step, where a step is the number of data seen so far,
+# or, for per-epoch schedules, the number of epochs (passes through the data) in do_batch_learning_RIP.
+# Its repr is written to the results file, so that the schedule used can be recovered.
+class schedule:
+    per_epoch = False
+
+    def at(self, datum_number, epoch_number=0):
+        if self.per_epoch:
+            return self.value(epoch_number)
+        else:
+            return self.value(datum_number)
+
+class constant_schedule(schedule):
+    def __init__(self, constant):
+        self.constant = float(constant)
+
+    def value(self, step):
+        return self.constant
+
+    def __repr__(self):
+        return str(self.constant)
+
+# points is a list of (step, value) tuples, in increasing order of step.
+# Each value holds from its step until the step of the next point.
+class piecewise_schedule(schedule):
+    def __init__(self, points, per_epoch=False):
+        if len(points) == 0 or points[0][0] != 0:
+            raise ValueError("The first point of a piecewise schedule must be at step 0.")
+        self.points = [(int(p[0]), float(p[1])) for p in points]
+        self.steps = [p[0] for p in self.points]
+        if self.steps != sorted(self.steps):
+            raise ValueError("Points of a piecewise schedule must be in increasing order of step.")
+        self.per_epoch = per_epoch
+
+    def value(self, step):
+        return self.points[bisect.bisect_right(self.steps, step)-1][1]
+
+    def __repr__(self):
+        return "piecewise_schedule("+str(self.points)+", per_epoch="+str(self.per_epoch)+")"
+
+# initial * decay**step, but never below floor
+class exponential_schedule(schedule):
+    def __init__(self, initial, decay, floor=0.0, per_epoch=False):
+        if not 0 < decay <= 1:
+            raise ValueError("Decay of an exponential schedule must be in (0, 1].")
+        self.initial = float(initial)
+        self.decay = float(decay)
+        self.floor = float(floor)
+        self.per_epoch = per_epoch
+
+    def value(self, step):
+        return max(self.initial * self.decay**step, self.floor)
+
+    def __repr__(self):
+        return "exponential_schedule(initial="+str(self.initial)+", decay="+str(self.decay)+", floor="+str(self.floor)+", per_epoch="+str(self.per_epoch)+")"
+
+def make_schedule(value_or_schedule):
+    if isinstance(value_or_schedule, schedule):
+        return value_or_schedule
+    else:
+        return constant_schedule(value_or_schedule)
+
+# For the learners that make a single pass through the data, where a per-epoch schedule would never leave its first value
+def datum_schedule(value_or_schedule):
+    made_schedule = make_schedule(value_or_schedule)
+    if made_schedule.per_epoch:
+        raise ValueError("Per-epoch schedules can only be used by learners that go through the data several times (batch learners).")
+    return made_schedule
+
+# Opt-in stopping criteria for the learners, which otherwise consume the whole target list.
+# window and max_error_rate: stop once the error rate over the last `window` data is at or below max_error_rate.
+# patience: stop once the grammar has not changed for `patience` data.
+# Either or both can be given; the run stops at the first one that is met.
+class stopping_rule:
+    def __init__(self, window=None, max_error_rate=None, patience=None):
+        if (window is None) != (max_error_rate is None):
+            raise ValueError("window and max_error_rate must be given together.")
+        if window is None and patience is None:
+            raise ValueError("No stopping criterion given.")
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.patience = patience
+        self.start()
+
+    # Called by the learners at the beginning of each run
+    def start(self):
+        # 1 for each of the last `window` data that caused an error, 0 otherwise
+        self.recent_errors = collections.deque()
+        self.recent_error_count = 0
+        self.since_change = 0
+        self.last_change_counter = 0
+
+    # Called by the learners after each datum, with the number of grammar changes so far.
+    # Returns the reason for stopping, or None if learning should go on.
+    def check(self, change_counter):
+        error = int(change_counter != self.last_change_counter)
+        self.last_change_counter = change_counter
+
+        if self.patience is not None:
+            if error:
+                self.since_change = 0
+            else:
+                self.since_change += 1
+            if self.since_change >= self.patience:
+                return "No grammar change in "+str(self.patience)+" data"
+
+        if self.window is not None:
+            self.recent_errors.append(error)
+            self.recent_error_count += error
+            if len(self.recent_errors) > self.window:
+                self.recent_error_count -= self.recent_errors.popleft()
+            if len(self.recent_errors) == self.window and self.recent_error_count <= self.max_error_rate*self.window:
+                return "Error rate "+str(self.recent_error_count/self.window)+" over the last "+str(self.window)+" data"
+
+        return None
+
+# Long RIP learning runs can write checkpoints every checkpoint_every data to checkpoint_path,
+# and resume from them (resume=True) after an interruption.
+# A checkpoint holds everything the learner needs to go on exactly where it was:
+# ranking values, counters, where it is in the data of the current epoch,
+# the trajectories, the stopping rule, and the state of the random number generator.
+# So a resumed run gives the same results as an uninterrupted one.
+# The checkpoint is written to a temporary file which then replaces the old checkpoint,
+# so an interruption while writing never leaves a broken checkpoint behind.
+# Once the run is done, its checkpoint is removed.
+def save_checkpoint(checkpoint_path, state):
+    state['random_state'] = random.getstate()
+    temp_path = checkpoint_path + '.tmp'
+    checkpoint_file = open(temp_path, 'wb')
+    pickle.dump(state, checkpoint_file, pickle.HIGHEST_PROTOCOL)
+    checkpoint_file.flush()
+    os.fsync(checkpoint_file.fileno())
+    checkpoint_file.close()
+    os.replace(temp_path, checkpoint_path)
+
+# With checkpoints, the trajectories are kept on disk (see mmap_tracks) even if no track_path is given,
+# next to the checkpoint, so that a checkpoint only holds their positions in the files
+# rather than the whole history so far (which would make every checkpoint of a long run slower than the last).
+def checkpoint_track_path(track_path, checkpoint_path):
+    if track_path is None and checkpoint_path is not None:
+        return checkpoint_path+'_tracks'
+    return track_path
+
+# A hash of what a run depends on: the learner and its parameters, the grammar (constraints, ranking values and targets),
+# the target data (the count of each type), and the state of the random number generator, all taken at the start of the run.
+# A checkpoint can only be resumed by a run with the same fingerprint.
+def checkpoint_fingerprint(learner, grammar, target_list, params):
+    if isinstance(target_list, list):
+        type_counts = collections.Counter(target_list)
+        types_and_counts = list(type_counts.items())
+    else:
+        types_and_counts = list(zip(target_list.types, target_list.counts))
+    fingerprint = hashlib.sha256()
+    fingerprint.update(repr((learner, list(grammar.const_dict.items()), grammar.targets, types_and_counts, params)).encode('utf-8'))
+    fingerprint.update(pickle.dumps(random.getstate()))
+    return fingerprint.hexdigest()
+
+# Returns the checkpointed state (and restores the random number generator),
+# or None if there is no checkpoint to resume from.
+# The checkpoint must have been written by the same learner, with the same fingerprint (see checkpoint_fingerprint).
+def load_checkpoint(checkpoint_path, learner, fingerprint):
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return None
+    checkpoint_file = open(checkpoint_path, 'rb')
+    state = pickle.load(checkpoint_file)
+    checkpoint_file.close()
+    if state['learner'] != learner:
+        raise ValueError("Checkpoint "+checkpoint_path+" was written by "+state['learner']+", not "+learner+".")
+    if state.get('fingerprint') != fingerprint:
+        raise ValueError("Checkpoint "+checkpoint_path+" was written by a run with a different grammar, target data, parameters or random seed.")
+    random.setstate(state['random_state'])
+    return state
+
+def remove_checkpoint(checkpoint_path):
+    if checkpoint_path is not None and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+# Store the results tuple returned by the do_*learning functions as attributes of a learning object
+def set_learning_results(learning_object, results, grammar, target_list, track_path=None):
+    learning_object.const_dict = results[0]
+    learning_object.change_counter = results[1]
+    learning_object.num_of_data = results[2]
+    learning_object.failed_set = results[3]
+    learning_object.plasticity = results[4]
+    learning_object.noise_bool = results[5]
+    learning_object.noise_sigma = results[6]
+    learning_object.ranking_value_tracks = results[7]
+    learning_object.learning_track = results[8]
+    learning_object.interval_track = results[9]
+    learning_object.stopped_at = results[10]
+    learning_object.stop_reason = results[11]
+    learning_object.type_counts = results[12]
+    learning_object.type_error_rates = results[12].error_rates()
+    # Cache of output_distribution
+    learning_object.output_distributions = {}
+    learning_object.track_path = track_path
+    learning_object.grammar = grammar
+    learning_object.target_list = target_list
+
+def do_learning(target_list, grammar, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, draw='shuffle'):
     i2o_tableaux = grammar.i2o_tableaux
     const_dict = grammar.const_dict
+    targets = grammar.targets
+    target_inputs = grammar.target_inputs
     
-    target_list_shuffled = random.sample(target_list, len(target_list))
-    target_set = set(target_list)
+    # The data come as target IDs, and are counted by target ID (see draw_target_ids)
+    target_stream = draw_target_ids(target_list, grammar, draw)
+    type_counts = type_counters(targets)
 
     datum_counter = 0
     change_counter = 0
-    learned_list = []
-
-    # Data to be plotted
-    # track the iteration number where change occurred
-    # (will plot the interval between changes)
-    interval_track = [] 
-    # track number of learned tokens
-    learning_track = []
-    # Track ranking values for each constraint
-    ranking_value_tracks = {}
-    for const in const_dict.keys():
-        ranking_value_tracks[const] = []
+    # Number of learned tokens (the number per type is kept in type_counts)
+    learned_count = 0
+
+    # Data to be plotted:
+    # ranking values for each constraint, number of learned tokens,
+    # and the iteration number where change occurred (will plot the interval between changes)
+    tracks = make_tracks(const_dict.keys(), track_path, len(target_list))
+
+    # Plasticity and noise may change over the course of learning
+    plasticity_schedule = datum_schedule(plasticity)
+    noise_schedule = datum_schedule(noise_sigma)
+
+    # Where and why learning stopped (if it stopped before the end of the data)
+    stopped_at = None
+    stop_reason = None
+    if stop is not None:
+        stop.start()
 
-    for t in target_list_shuffled:
+    for t_id in target_stream:
         datum_counter += 1
 
-        inp = find_input(t, i2o_tableaux)[0]
+        t = targets[t_id]
+        inp = target_inputs[t_id]
         if noise_bool==True:    
-            generation = generate(inp, ranking(add_noise(const_dict, noise_sigma)), i2o_tableaux)
+            generation = generate(inp, ranking(add_noise(const_dict, noise_schedule.at(datum_counter-1))), i2o_tableaux)
         else:
             generation = generate(inp, ranking(const_dict), i2o_tableaux)
 
         if generation[0] == t:
-            learned_list.append(t)
-
-            ### Export information for plotting
-            for const in ranking_value_tracks.keys():
-                ranking_value_tracks[const].append(const_dict[const])
+            learned_count += 1
+            type_counts.record_id(t_id, True)
         else:
+            type_counts.record_id(t_id, False)
             change_counter += 1
             # new grammar
-            const_dict = learn(i2o_tableaux[inp][t], generation[1], const_dict, plasticity)
+            const_dict = learn(i2o_tableaux[inp][t], generation[1], const_dict, plasticity_schedule.at(datum_counter-1))
             # new generation with new grammar
             generation = generate(inp, ranking(const_dict), i2o_tableaux)
 
             ### Export information for plotting
-            for const in ranking_value_tracks.keys():
-                ranking_value_tracks[const].append(const_dict[const])
-            
-            interval_track.append(datum_counter)
+            tracks.record_change(datum_counter)
         
         ### Export information for plotting
-        learning_track.append(len(learned_list))
+        tracks.record(const_dict, learned_count)
+
+        if stop is not None:
+            stop_reason = stop.check(change_counter)
+            if stop_reason is not None:
+                stopped_at = datum_counter
+                break
 
         if print_bool==True and datum_counter % print_cycle == 0:
-            print(str(datum_counter)+" out of "+str(len(target_list_shuffled))+" learned")
+            print(str(datum_counter)+" out of "+str(len(target_list))+" learned")
     
-    learned_set = set(learned_list)
-    failed_set = target_set.difference(learned_set)
+    ranking_value_tracks, learning_track, interval_track = tracks.close()
+
+    # Only the types of the target data are kept
+    type_counts = type_counts.subset(target_types(target_list))
+    failed_set = type_counts.failed_set()
 
-    return (const_dict, change_counter, len(target_list), failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track)
+    return (const_dict, change_counter, datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track, stopped_at, stop_reason, type_counts)
 
 class learning:
-    def __init__(self, target_list, grammar, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
-        results = do_learning(target_list, grammar, plasticity, noise_bool, noise_sigma, print_bool, print_cycle)
-        self.const_dict = results[0]
-        self.change_counter = results[1]
-        self.num_of_data = results[2]
-        self.failed_set = results[3]
-        self.plasticity = results[4]
-        self.noise_bool = results[5]
-        self.noise_sigma = results[6]
-        self.ranking_value_tracks = results[7]
-        self.learning_track = results[8]
-        self.interval_track = results[9]
-        self.grammar = grammar
-        self.target_list = target_list
+    def __init__(self, target_list, grammar, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, draw='shuffle'):
+        results = do_learning(target_list, grammar, plasticity, noise_bool, noise_sigma, print_bool, print_cycle, track_path, stop, draw)
+        set_learning_results(self, results, grammar, target_list, track_path)
+        self.draw = draw
 
-def do_learning_RIP(target_list, grammar_RIP, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
+def do_learning_RIP(target_list, grammar_RIP, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, checkpoint_path=None, checkpoint_every=10000, resume=False, draw='shuffle'):
 
     #logfilename = timestamp_filepath('txt', 'log')
     #logfile = open(logfilename, 'w')
@@ -582,176 +1665,603 @@ def do_learning_RIP(target_list, grammar_RIP, plasticity=1.0, noise_bool=True, n
     o2p_tableaux = grammar_RIP.o2p_tableaux
     i2o_tableaux = grammar_RIP.i2o_tableaux
     const_dict = grammar_RIP.const_dict
+    targets = grammar_RIP.targets
+    target_inputs = grammar_RIP.target_inputs
+    track_path = checkpoint_track_path(track_path, checkpoint_path)
+    # Taken before anything is drawn at random
+    if checkpoint_path is not None:
+        fingerprint = checkpoint_fingerprint('do_learning_RIP', grammar_RIP, target_list, (plasticity, noise_bool, noise_sigma, draw))
     
-    target_list_shuffled = random.sample(target_list, len(target_list))
-    target_set = set(target_list)
+    # The data come as target IDs, and are counted by target ID (see draw_target_ids)
+    target_stream = draw_target_ids(target_list, grammar_RIP, draw)
+    type_counts = type_counters(targets)
 
     datum_counter = 0
     change_counter = 0
-    learned_list = []
-
-    # Data to be plotted
-    # track the iteration number where change occurred
-    # (will plot the interval between changes)
-    interval_track = [] 
-    # track number of learned tokens
-    learning_track = []
-    # Track ranking values for each constraint
-    ranking_value_tracks = {}
-    for const in const_dict.keys():
-        ranking_value_tracks[const] = []
-
-
-    for t in target_list_shuffled:
+    # Number of learned tokens (the number per type is kept in type_counts)
+    learned_count = 0
+
+    state = None
+    if resume:
+        state = load_checkpoint(checkpoint_path, 'do_learning_RIP', fingerprint)
+
+    # Data to be plotted:
+    # ranking values for each constraint, number of learned tokens,
+    # and the iteration number where change occurred (will plot the interval between changes)
+    # (when resuming, the trajectories so far come from the checkpoint)
+    if state is None:
+        tracks = make_tracks(const_dict.keys(), track_path, len(target_list))
+
+    # Plasticity and noise may change over the course of learning
+    plasticity_schedule = datum_schedule(plasticity)
+    noise_schedule = datum_schedule(noise_sigma)
+
+    # Where and why learning stopped (if it stopped before the end of the data)
+    stopped_at = None
+    stop_reason = None
+    if stop is not None:
+        stop.start()
+
+    # Pick up where the checkpointed run left off
+    if state is not None:
+        const_dict.update(state['const_dict'])
+        datum_counter = state['datum_counter']
+        change_counter = state['change_counter']
+        learned_count = state['learned_count']
+        type_counts = state['type_counts']
+        target_stream = state['target_stream']
+        if hasattr(target_stream, 'attach'):
+            target_stream.attach(target_list)
+        tracks = state['tracks']
+        stop = state['stop']
+
+    for t_id in target_stream:
         datum_counter += 1
 
+        t = targets[t_id]
+        inp = target_inputs[t_id]
+
         errors = ['[H1 L L L H2]', '[L1 L L L H2]', '[H1 L L H2 H2]', '[H1 L L H2 L]', '[H1 L L H2]', '[H1 H2 L L H2]', '[L H1 L L H2]']
 
         if noise_bool==True:
-            const_dict_noisy = add_noise(const_dict, noise_sigma)
-            generation = generate(make_input(t), ranking(const_dict_noisy), i2p_tableaux)
+            const_dict_noisy = add_noise(const_dict, noise_schedule.at(datum_counter-1))
+            generation = generate(inp, ranking(const_dict_noisy), i2p_tableaux)
             rip_parse = generate(t, ranking(const_dict_noisy), o2p_tableaux)
         else:
-            generation = generate(make_input(t), ranking(const_dict), i2p_tableaux)
+            generation = generate(inp, ranking(const_dict), i2p_tableaux)
             rip_parse = generate(t, ranking(const_dict), o2p_tableaux)
 
         if generation[0] == rip_parse[0]:
-            learned_list.append(t)
-
-            ### Export information for plotting
-            for const in ranking_value_tracks.keys():
-                ranking_value_tracks[const].append(const_dict[const])
+            learned_count += 1
+            type_counts.record_id(t_id, True)
             
             #if t in errors:
             #    logfile.write("\n"+str(datum_counter)+": Target: "+t+"\nGenerated Parse: "+generation[0]+", RIP Parse: "+rip_parse[0]+"\n")
         else:
-            gen_overt = generate(make_input(t), ranking(const_dict), i2o_tableaux)
+            type_counts.record_id(t_id, False)
+            gen_overt = generate(inp, ranking(const_dict), i2o_tableaux)
             #logfile.write("\nError at "+str(datum_counter)+"\n")
             #logfile.write("\nTarget: "+t+", Generated Form: "+gen_overt[0]+"\nGenerated Parse: "+generation[0]+", RIP Parse: "+rip_parse[0]+"\n")
 
             change_counter += 1
             # new grammar
-            const_dict = learn(rip_parse[1], generation[1], const_dict, plasticity)
+            const_dict = learn(rip_parse[1], generation[1], const_dict, plasticity_schedule.at(datum_counter-1))
             # new generation with new grammar
-            generation = generate(make_input(t), ranking(const_dict), i2p_tableaux)
+            generation = generate(inp, ranking(const_dict), i2p_tableaux)
             # new rip parse with new grammar
             rip_parse = generate(t, ranking(const_dict), o2p_tableaux)
 
             ### Export information for plotting
-            for const in ranking_value_tracks.keys():
-                ranking_value_tracks[const].append(const_dict[const])
-            
-            interval_track.append(datum_counter)
+            tracks.record_change(datum_counter)
         
         ### Export information for plotting
-        learning_track.append(len(learned_list))
+        tracks.record(const_dict, learned_count)
+
+        if stop is not None:
+            stop_reason = stop.check(change_counter)
+            if stop_reason is not None:
+                stopped_at = datum_counter
+                break
 
         if print_bool and datum_counter % print_cycle == 0:
-            print(str(datum_counter)+" out of "+str(len(target_list_shuffled))+" learned")
+            print(str(datum_counter)+" out of "+str(len(target_list))+" learned")
+
+        if checkpoint_path is not None and datum_counter % checkpoint_every == 0:
+            save_checkpoint(checkpoint_path, {'learner': 'do_learning_RIP', 'fingerprint': fingerprint, 'const_dict': const_dict,
+                                              'datum_counter': datum_counter, 'change_counter': change_counter,
+                                              'learned_count': learned_count, 'type_counts': type_counts,
+                                              'target_stream': target_stream, 'tracks': tracks, 'stop': stop})
 
-    learned_set = set(learned_list)
-    failed_set = target_set.difference(learned_set)
+    ranking_value_tracks, learning_track, interval_track = tracks.close()
+    remove_checkpoint(checkpoint_path)
+
+    # Only the types of the target data are kept
+    type_counts = type_counts.subset(target_types(target_list))
+    failed_set = type_counts.failed_set()
 
     #logfile.close()
 
-    return (const_dict, change_counter, len(target_list), failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track)
+    return (const_dict, change_counter, datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track, stopped_at, stop_reason, type_counts)
 
 class learning_RIP:
-    def __init__(self, target_list, grammar_RIP, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
-        results = do_learning_RIP(target_list, grammar_RIP, plasticity, noise_bool, noise_sigma, print_bool, print_cycle)
-        self.const_dict = results[0]
-        self.change_counter = results[1]
-        self.num_of_data = results[2]
-        self.failed_set = results[3]
-        self.plasticity = results[4]
-        self.noise_bool = results[5]
-        self.noise_sigma = results[6]
-        self.ranking_value_tracks = results[7]
-        self.learning_track = results[8]
-        self.interval_track = results[9]
-        self.grammar = grammar_RIP
-        self.target_list = target_list
+    def __init__(self, target_list, grammar_RIP, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, checkpoint_path=None, checkpoint_every=10000, resume=False, draw='shuffle'):
+        results = do_learning_RIP(target_list, grammar_RIP, plasticity, noise_bool, noise_sigma, print_bool, print_cycle, track_path, stop, checkpoint_path, checkpoint_every, resume, draw)
+        set_learning_results(self, results, grammar_RIP, target_list, checkpoint_track_path(track_path, checkpoint_path))
+        self.draw = draw
 
-def do_batch_learning_RIP(target_list, grammar_RIP, batch=100, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
+def do_batch_learning_RIP(target_list, grammar_RIP, batch=100, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, checkpoint_path=None, checkpoint_every=10000, resume=False):
     i2p_tableaux = grammar_RIP.i2p_tableaux
     o2p_tableaux = grammar_RIP.o2p_tableaux
     const_dict = grammar_RIP.const_dict
+    targets = grammar_RIP.targets
+    target_inputs = grammar_RIP.target_inputs
+    track_path = checkpoint_track_path(track_path, checkpoint_path)
+    # Taken before anything is drawn at random
+    if checkpoint_path is not None:
+        fingerprint = checkpoint_fingerprint('do_batch_learning_RIP', grammar_RIP, target_list, (batch, plasticity, noise_bool, noise_sigma))
     
-    target_set = set(target_list)
+    # The data are counted by target ID (see draw_target_ids)
+    type_counts = type_counters(targets)
 
     datum_counter = 0
     change_counter = 0
-    learned_list = []
-
-    # Data to be plotted
-    # track the iteration number where change occurred
-    # (will plot the interval between changes)
-    interval_track = [] 
-    # track number of learned tokens
-    learning_track = []
-    # Track ranking values for each constraint
-    ranking_value_tracks = {}
-    for const in const_dict.keys():
-        ranking_value_tracks[const] = []
-
-    for i in range(batch):
-        target_list_shuffled = random.sample(target_list, len(target_list))
-        for t in target_list_shuffled:
+    # Number of learned tokens (the number per type is kept in type_counts)
+    learned_count = 0
+
+    state = None
+    if resume:
+        state = load_checkpoint(checkpoint_path, 'do_batch_learning_RIP', fingerprint)
+
+    # Data to be plotted:
+    # ranking values for each constraint, number of learned tokens,
+    # and the iteration number where change occurred (will plot the interval between changes)
+    # (when resuming, the trajectories so far come from the checkpoint)
+    if state is None:
+        tracks = make_tracks(const_dict.keys(), track_path, batch*len(target_list))
+
+    # Plasticity and noise may change over the course of learning
+    plasticity_schedule = make_schedule(plasticity)
+    noise_schedule = make_schedule(noise_sigma)
+
+    # Where and why learning stopped (if it stopped before the end of the data)
+    stopped_at = None
+    stop_reason = None
+    if stop is not None:
+        stop.start()
+
+    # Epoch (pass through the data) and the data still to come in it
+    i = 0
+    target_stream = None
+
+    # Pick up where the checkpointed run left off
+    if state is not None:
+        const_dict.update(state['const_dict'])
+        datum_counter = state['datum_counter']
+        change_counter = state['change_counter']
+        learned_count = state['learned_count']
+        type_counts = state['type_counts']
+        i = state['epoch']
+        target_stream = state['target_stream']
+        if hasattr(target_stream, 'attach'):
+            target_stream.attach(target_list)
+        tracks = state['tracks']
+        stop = state['stop']
+
+    while i < batch:
+        if target_stream is None:
+            target_stream = draw_target_ids(target_list, grammar_RIP)
+        for t_id in target_stream:
             datum_counter += 1
+            t = targets[t_id]
+            inp = target_inputs[t_id]
             if noise_bool==True:
-                const_dict_noisy = add_noise(const_dict, noise_sigma)
-                generation = generate(make_input(t), ranking(const_dict_noisy), i2p_tableaux)
+                const_dict_noisy = add_noise(const_dict, noise_schedule.at(datum_counter-1, i))
+                generation = generate(inp, ranking(const_dict_noisy), i2p_tableaux)
                 rip_parse = generate(t, ranking(const_dict_noisy), o2p_tableaux)
             else:
-                generation = generate(make_input(t), ranking(const_dict), i2p_tableaux)
+                generation = generate(inp, ranking(const_dict), i2p_tableaux)
                 rip_parse = generate(t, ranking(const_dict), o2p_tableaux)
 
             if generation[0] == rip_parse[0]:
-                learned_list.append(t)
-                ### Export information for plotting
-                for const in ranking_value_tracks.keys():
-                    ranking_value_tracks[const].append(const_dict[const])
+                learned_count += 1
+                type_counts.record_id(t_id, True)
             else:
+                type_counts.record_id(t_id, False)
                 change_counter += 1
                 # new grammar
-                const_dict = learn(rip_parse[1], generation[1], const_dict, plasticity)
+                const_dict = learn(rip_parse[1], generation[1], const_dict, plasticity_schedule.at(datum_counter-1, i))
                 # new generation with new grammar
-                generation = generate(make_input(t), ranking(const_dict), i2p_tableaux)
+                generation = generate(inp, ranking(const_dict), i2p_tableaux)
                 # new rip parse with new grammar
                 rip_parse = generate(t, ranking(const_dict), o2p_tableaux)
 
                 ### Export information for plotting
-                for const in ranking_value_tracks.keys():
-                    ranking_value_tracks[const].append(const_dict[const])
-                
-                interval_track.append(datum_counter)
+                tracks.record_change(datum_counter)
             
             ### Export information for plotting
-            learning_track.append(len(learned_list))
+            tracks.record(const_dict, learned_count)
+
+            if stop is not None:
+                stop_reason = stop.check(change_counter)
+                if stop_reason is not None:
+                    stopped_at = datum_counter
+                    break
+
+            if checkpoint_path is not None and datum_counter % checkpoint_every == 0:
+                save_checkpoint(checkpoint_path, {'learner': 'do_batch_learning_RIP', 'fingerprint': fingerprint, 'const_dict': const_dict,
+                                                  'datum_counter': datum_counter, 'change_counter': change_counter,
+                                                  'learned_count': learned_count, 'type_counts': type_counts,
+                                                  'epoch': i, 'target_stream': target_stream, 'tracks': tracks, 'stop': stop})
+
+        if stop_reason is not None:
+            break
+        target_stream = None
+        i += 1
 
     if print_bool and datum_counter % print_cycle == 0:
-        print(str(datum_counter)+" out of "+str(len(target_list_shuffled))+" learned")
+        print(str(datum_counter)+" out of "+str(batch*len(target_list))+" learned")
 
-    learned_set = set(learned_list)
-    failed_set = target_set.difference(learned_set)
+    ranking_value_tracks, learning_track, interval_track = tracks.close()
+    remove_checkpoint(checkpoint_path)
 
-    return (const_dict, change_counter, datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track)
+    # Only the types of the target data are kept
+    type_counts = type_counts.subset(target_types(target_list))
+    failed_set = type_counts.failed_set()
+
+    return (const_dict, change_counter, datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track, stopped_at, stop_reason, type_counts)
 
 class batch_learnig_RIP:
-    def __init__(self, target_list, grammar_RIP, batch=100, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000):
-        results = do_batch_learning_RIP(target_list, grammar_RIP, batch, plasticity, noise_bool, noise_sigma, print_bool, print_cycle)
-        self.const_dict = results[0]
-        self.change_counter = results[1]
-        self.num_of_data = results[2]
-        self.failed_set = results[3]
-        self.plasticity = results[4]
-        self.noise_bool = results[5]
-        self.noise_sigma = results[6]
-        self.ranking_value_tracks = results[7]
-        self.learning_track = results[8]
-        self.interval_track = results[9]
-        self.grammar = grammar_RIP
-        self.target_list = target_list
+    def __init__(self, target_list, grammar_RIP, batch=100, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, stop=None, checkpoint_path=None, checkpoint_every=10000, resume=False):
+        results = do_batch_learning_RIP(target_list, grammar_RIP, batch, plasticity, noise_bool, noise_sigma, print_bool, print_cycle, track_path, stop, checkpoint_path, checkpoint_every, resume)
+        set_learning_results(self, results, grammar_RIP, target_list, checkpoint_track_path(track_path, checkpoint_path))
+        self.batch = batch
+
+# Mini-batch RIP/OT-GLA.
+# Instead of evaluating and updating the grammar one token at a time, the learner takes minibatch_size tokens,
+# evaluates all of them at once (each under its own noisy ranking) with the vectorized EVAL of tableau_array,
+# and then applies the sum of the GLA updates from all the errors in the mini-batch together.
+# Otherwise the same as do_batch_learning_RIP: batch is the number of passes through the data.
+# Within a mini-batch the grammar does not change, so all data in it share the ranking values recorded for plotting.
+def do_minibatch_learning_RIP(target_list, grammar_RIP, batch=100, minibatch_size=32, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, seed=None):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+
+    consts = list(grammar_RIP.const_dict.keys())
+    const_dict = grammar_RIP.const_dict
+    ranking_values = np.array([const_dict[const] for const in consts], dtype=np.float64)
+    i2p_compiled = tableau_array(grammar_RIP.i2p_tableaux, consts)
+    o2p_compiled = tableau_array(grammar_RIP.o2p_tableaux, consts)
+
+    # Number the parses, so that generated and RIP parses can be compared as integers
+    parse_ids = {}
+    code_arrays = []
+    for compiled in (i2p_compiled, o2p_compiled):
+        codes = np.full(compiled.viols.shape[:2], -1, dtype=np.int64)
+        for i in range(len(compiled.keys)):
+            for j in range(len(compiled.cands[i])):
+                codes[i, j] = parse_ids.setdefault(compiled.cands[i][j], len(parse_ids))
+        code_arrays.append(codes)
+    i2p_codes, o2p_codes = code_arrays
+
+    # Look up the input and overt tableau of each target type only once, by target ID (see draw_target_ids)
+    type_counts = type_counters(grammar_RIP.targets)
+    inp_key_ids = np.full(len(grammar_RIP.targets), -1, dtype=np.int64)
+    overt_key_ids = np.full(len(grammar_RIP.targets), -1, dtype=np.int64)
+    for t in target_types(target_list):
+        if t not in grammar_RIP.target_ids:
+            raise ValueError(t+" is not a target in this grammar.")
+        t_id = grammar_RIP.target_ids[t]
+        inp_key_ids[t_id] = i2p_compiled.key_ids[grammar_RIP.target_inputs[t_id]]
+        overt_key_ids[t_id] = o2p_compiled.key_ids[t]
+
+    plasticity_schedule = make_schedule(plasticity)
+    noise_schedule = make_schedule(noise_sigma)
+
+    datum_counter = 0
+    change_counter = 0
+    learned_count = 0
+
+    tracks = make_tracks(consts, track_path, batch*len(target_list))
+
+    for i in range(batch):
+        target_stream = draw_target_ids(target_list, grammar_RIP)
+        while True:
+            minibatch = list(itertools.islice(target_stream, minibatch_size))
+            if len(minibatch) == 0:
+                break
+            inp_ids = inp_key_ids[minibatch]
+            overt_ids = overt_key_ids[minibatch]
+
+            if noise_bool==True:
+                noisy_values = ranking_values + rng.normal(0, noise_schedule.at(datum_counter, i), (len(minibatch), len(consts)))
+            else:
+                noisy_values = np.broadcast_to(ranking_values, (len(minibatch), len(consts)))
+            generated = i2p_compiled.winners(noisy_values, inp_ids, rng)
+            rip_parses = o2p_compiled.winners(noisy_values, overt_ids, rng)
+
+            correct = i2p_codes[inp_ids, generated] == o2p_codes[overt_ids, rip_parses]
+            errors = np.nonzero(~correct)[0]
+            if len(errors) > 0:
+                # Same classification as learn, with the RIP parse as the winner and the generated parse as the loser,
+                # summed over all the errors in the mini-batch
+                viol_diff = o2p_compiled.viols[overt_ids[errors], rip_parses[errors]] - i2p_compiled.viols[inp_ids[errors], generated[errors]]
+                good = viol_diff < 0
+                bad = viol_diff > 0
+                num_good = good.sum(axis=1, keepdims=True)
+                current_plasticity = plasticity_schedule.at(datum_counter, i)
+                promotion = np.where(good, current_plasticity/np.maximum(num_good, 1), 0.0)
+                demotion = np.where(bad, current_plasticity, 0.0)
+                ranking_values += (promotion - demotion).sum(axis=0)
+                change_counter += len(errors)
+                for const_index in range(len(consts)):
+                    const_dict[consts[const_index]] = float(ranking_values[const_index])
+
+            for k in range(len(minibatch)):
+                datum_counter += 1
+                type_counts.record_id(minibatch[k], correct[k])
+                if correct[k]:
+                    learned_count += 1
+                else:
+                    ### Export information for plotting
+                    tracks.record_change(datum_counter)
+                ### Export information for plotting
+                tracks.record(const_dict, learned_count)
+
+                if print_bool and datum_counter % print_cycle == 0:
+                    print(str(datum_counter)+" out of "+str(batch*len(target_list))+" learned")
+
+    ranking_value_tracks, learning_track, interval_track = tracks.close()
+
+    # Only the types of the target data are kept
+    type_counts = type_counts.subset(target_types(target_list))
+    failed_set = type_counts.failed_set()
+
+    return (const_dict, change_counter, datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_track, None, None, type_counts)
+
+class minibatch_learning_RIP:
+    def __init__(self, target_list, grammar_RIP, batch=100, minibatch_size=32, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_path=None, seed=None):
+        results = do_minibatch_learning_RIP(target_list, grammar_RIP, batch, minibatch_size, plasticity, noise_bool, noise_sigma, print_bool, print_cycle, track_path, seed)
+        set_learning_results(self, results, grammar_RIP, target_list, track_path)
+        self.batch = batch
+        self.minibatch_size = minibatch_size
+
+# Lockstep simulation of many independent learners on one shared data stream.
+# This runs the same learning as do_learning for num_learners learners at once:
+# their ranking values are the rows of a (learners x constraints) array,
+# and the noise draws, EVAL and GLA updates of all learners are done in single numpy calls.
+# Each learner draws its own noise, so the learners are independent apart from hearing the same data in the same order.
+# Returns a list of results tuples, one per learner, in the same format as do_learning.
+# Trajectories are not kept unless track_bool is True, since they take (data x learners x constraints) floats of memory;
+# they are then kept in numpy arrays.
+def do_lockstep_learning(target_list, grammar, num_learners=10, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_bool=False, seed=None):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+
+    i2o_tableaux = grammar.i2o_tableaux
+    consts = list(grammar.const_dict.keys())
+    compiled = tableau_array(i2o_tableaux, consts)
+    ranking_values = np.tile([grammar.const_dict[const] for const in consts], (num_learners, 1)).astype(np.float64)
+
+    # The data come as target IDs (see draw_target_ids)
+    target_stream = draw_target_ids(target_list, grammar)
+    targets = grammar.targets
+    # Look up the tableau and candidate of each target only once
+    type_key_ids = []
+    type_cand_ids = []
+    for t_id in range(len(targets)):
+        key_id = compiled.key_ids[grammar.target_inputs[t_id]]
+        type_key_ids.append(key_id)
+        type_cand_ids.append(compiled.cand_ids[key_id][targets[t_id]])
+
+    plasticity_schedule = datum_schedule(plasticity)
+    noise_schedule = datum_schedule(noise_sigma)
+
+    datum_counter = 0
+    change_counters = np.zeros(num_learners, dtype=np.int64)
+    learned_counts = np.zeros(num_learners, dtype=np.int64)
+    # Number of times each learner learned and failed each target
+    type_learned_counts = np.zeros((num_learners, len(targets)), dtype=np.int64)
+    type_failed_counts = np.zeros((num_learners, len(targets)), dtype=np.int64)
+
+    if track_bool:
+        rv_tracks = np.empty((len(target_list), num_learners, len(consts)))
+        learning_tracks = np.empty((len(target_list), num_learners), dtype=np.int64)
+    interval_tracks = [[] for m in range(num_learners)]
+
+    for type_id in target_stream:
+        datum_counter += 1
+        key_id = type_key_ids[type_id]
+        target_cand_id = type_cand_ids[type_id]
+
+        if noise_bool==True:
+            noisy_values = ranking_values + rng.normal(0, noise_schedule.at(datum_counter-1), ranking_values.shape)
+        else:
+            noisy_values = ranking_values
+        generated = compiled.winners(noisy_values, key_id, rng)
+
+        correct = generated == target_cand_id
+        learned_counts += correct
+        type_learned_counts[:, type_id] += correct
+        type_failed_counts[:, type_id] += ~correct
+
+        errors = np.nonzero(~correct)[0]
+        if len(errors) > 0:
+            # Same classification as learn: constraints violated more by the datum are bad,
+            # those violated more by the generated form are good
+            viol_diff = compiled.viols[key_id, target_cand_id][None, :] - compiled.viols[key_id, generated[errors]]
+            good = viol_diff < 0
+            bad = viol_diff > 0
+            num_good = good.sum(axis=1, keepdims=True)
+            current_plasticity = plasticity_schedule.at(datum_counter-1)
+            promotion = np.where(good, current_plasticity/np.maximum(num_good, 1), 0.0)
+            demotion = np.where(bad, current_plasticity, 0.0)
+            ranking_values[errors] += promotion - demotion
+            change_counters[errors] += 1
+            for m in errors:
+                interval_tracks[m].append(datum_counter)
+
+        if track_bool:
+            rv_tracks[datum_counter-1] = ranking_values
+            learning_tracks[datum_counter-1] = learned_counts
+
+        if print_bool==True and datum_counter % print_cycle == 0:
+            print(str(datum_counter)+" out of "+str(len(target_list))+" learned")
+
+    types = target_types(target_list)
+    all_results = []
+    for m in range(num_learners):
+        const_dict = {}
+        ranking_value_tracks = {}
+        for c in range(len(consts)):
+            const_dict[consts[c]] = float(ranking_values[m, c])
+            if track_bool:
+                ranking_value_tracks[consts[c]] = rv_tracks[:, m, c]
+        if track_bool:
+            learning_track = learning_tracks[:, m]
+        else:
+            learning_track = []
+        # Only the types of the target data are kept
+        type_counts = type_counters(targets, type_learned_counts[m], type_failed_counts[m]).subset(types)
+        failed_set = type_counts.failed_set()
+        all_results.append((const_dict, int(change_counters[m]), datum_counter, failed_set, plasticity, noise_bool, noise_sigma, ranking_value_tracks, learning_track, interval_tracks[m], None, None, type_counts))
+
+    return all_results
+
+# learners is a list of learning-compatible objects, one per simulated learner
+class lockstep_learning:
+    def __init__(self, target_list, grammar, num_learners=10, plasticity=1.0, noise_bool=True, noise_sigma=2.0, print_bool=True, print_cycle=1000, track_bool=False, seed=None):
+        all_results = do_lockstep_learning(target_list, grammar, num_learners, plasticity, noise_bool, noise_sigma, print_bool, print_cycle, track_bool, seed)
+        self.learners = []
+        for results in all_results:
+            learner = learning.__new__(learning)
+            set_learning_results(learner, results, grammar, target_list)
+            self.learners.append(learner)
+
+# Hogwild-style parallel learning.
+# Several worker processes learn from disjoint shards of the (shuffled) target list at the same time,
+# all reading and updating one vector of ranking values in shared memory, without any locking.
+# An update from one worker can occasionally be overwritten by another,
+# but updates are small and rare relative to the data, so the grammar learned should still be comparable to a serial run.
+# Trajectories are not tracked.
+
+# A const_dict whose ranking values live in a shared array, so that learn and adjust_grammar can update it in place
+class shared_const_dict:
+    def __init__(self, consts, shared_values):
+        self.consts = consts
+        self.shared_values = shared_values
+        self.const_index = {}
+        for i in range(len(consts)):
+            self.const_index[consts[i]] = i
+
+    def keys(self):
+        return self.consts
+
+    def __iter__(self):
+        return iter(self.consts)
+
+    def __getitem__(self, const):
+        return self.shared_values[self.const_index[const]]
+
+    def __setitem__(self, const, value):
+        self.shared_values[self.const_index[const]] = value
+
+    # A plain (unshared) snapshot of the current ranking values
+    def copy(self):
+        snapshot = {}
+        for i in range(len(self.consts)):
+            snapshot[self.consts[i]] = self.shared_values[i]
+        return snapshot
+
+# Set once in each worker process by init_hogwild_worker
+hogwild_grammar = None
+hogwild_const_dict = None
+
+def init_hogwild_worker(grammar, consts, shared_values):
+    global hogwild_grammar, hogwild_const_dict
+    hogwild_grammar = grammar
+    hogwild_const_dict = shared_const_dict(consts, shared_values)
+
+# Learn from one shard of the data; returns the number of changes and the per-type counts.
+# Plasticity and noise may be schedules (see make_schedule). The shards are learned at the same time,
+# so the i-th datum of shard k of num_shards is taken to be datum i*num_shards+k of the whole run.
+def hogwild_shard(task):
+    shard, shard_index, num_shards, plasticity, noise_bool, noise_sigma, seed = task
+    random.seed(seed)
+    if isinstance(shard, target_distribution):
+        shard = shard.shuffled()
+    i2o_tableaux = hogwild_grammar.i2o_tableaux
+    const_dict = hogwild_const_dict
+    targets = hogwild_grammar.targets
+    target_inputs = hogwild_grammar.target_inputs
+
+    plasticity_schedule = make_schedule(plasticity)
+    noise_schedule = make_schedule(noise_sigma)
+
+    datum_number = shard_index
+    change_counter = 0
+    # The data are looked up and counted by target ID (see draw_target_ids)
+    type_counts = type_counters(targets)
+    for t_id in interned_targets(iter(shard), hogwild_grammar.target_ids):
+        t = targets[t_id]
+        inp = target_inputs[t_id]
+        if noise_bool==True:
+            generation = generate(inp, ranking(add_noise(const_dict, noise_schedule.at(datum_number))), i2o_tableaux)
+        else:
+            generation = generate(inp, ranking(const_dict.copy()), i2o_tableaux)
+
+        if generation[0] == t:
+            type_counts.record_id(t_id, True)
+        else:
+            type_counts.record_id(t_id, False)
+            change_counter += 1
+            learn(i2o_tableaux[inp][t], generation[1], const_dict, plasticity_schedule.at(datum_number))
+        datum_number += num_shards
+    return (change_counter, type_counts)
+
+def do_hogwild_learning(target_list, grammar, processes=None, plasticity=1.0, noise_bool=True, noise_sigma=2.0):
+    if processes is None:
+        processes = os.cpu_count()
+    # Checked here rather than in the workers (see hogwild_shard)
+    datum_schedule(plasticity)
+    datum_schedule(noise_sigma)
+    consts = list(grammar.const_dict.keys())
+    shared_values = multiprocessing.RawArray('d', [grammar.const_dict[const] for const in consts])
+
+    # A target distribution (or file stream) is split into smaller distributions, which each worker shuffles itself
+    if not isinstance(target_list, list):
+        shards = target_distribution(zip(target_list.types, target_list.counts)).split(processes)
+    else:
+        target_list_shuffled = random.sample(target_list, len(target_list))
+        shards = [target_list_shuffled[k::processes] for k in range(processes)]
+    tasks = []
+    for k in range(processes):
+        tasks.append((shards[k], k, processes, plasticity, noise_bool, noise_sigma, random.getrandbits(64)))
+
+    pool = multiprocessing.Pool(processes, init_hogwild_worker, (grammar, consts, shared_values))
+    try:
+        shard_results = pool.map(hogwild_shard, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    const_dict = grammar.const_dict
+    for i in range(len(consts)):
+        const_dict[consts[i]] = shared_values[i]
+    change_counter = sum([r[0] for r in shard_results])
+    type_counts = type_counters(grammar.targets)
+    for r in shard_results:
+        type_counts.update(r[1])
+    # Only the types of the target data are kept
+    type_counts = type_counts.subset(target_types(target_list))
+    failed_set = type_counts.failed_set()
+
+    return (const_dict, change_counter, len(target_list), failed_set, plasticity, noise_bool, noise_sigma, {}, [], [], None, None, type_counts)
+
+class hogwild_learning:
+    def __init__(self, target_list, grammar, processes=None, plasticity=1.0, noise_bool=True, noise_sigma=2.0):
+        results = do_hogwild_learning(target_list, grammar, processes, plasticity, noise_bool, noise_sigma)
+        set_learning_results(self, results, grammar, target_list)
+        self.processes = processes
 
 def timestamp_filepath(extension, label=''):
     # Timestamp for file
@@ -764,56 +2274,523 @@ def timestamp_filepath(extension, label=''):
     timestamp = yy+mm+dd+"_"+hh+mn+ss
 
     # Designate absolute path of results file and open it
+    # (in a results folder next to it, made if it is not there yet)
     script_path = os.path.dirname(os.path.realpath(sys.argv[0])) #<-- absolute dir the script is in
-    output_path = script_path + '\\results'
-    output_file_name = "\\"+label+"_"+timestamp+'.'+extension
-    output_file_path = output_path + output_file_name
+    output_path = os.path.join(script_path, 'results')
+    os.makedirs(output_path, exist_ok=True)
+    output_file_name = label+"_"+timestamp+'.'+extension
+    output_file_path = os.path.join(output_path, output_file_name)
 
     return output_file_path
 
-def eval_errors(learning, num):
-    target_list = learning.target_list
-    ranked_consts = ranking(learning.const_dict)
+# The tableau_array of one of a grammar's sets of tableaux ('i2o_tableaux', 'i2p_tableaux' or 'o2p_tableaux'),
+# compiled once and kept on the grammar
+def compile_grammar_tableaux(grammar, tableaux_name='i2o_tableaux'):
+    consts = list(grammar.const_dict.keys())
+    cache_key = (tableaux_name, tuple(consts))
+    if cache_key not in grammar.compiled_tableaux:
+        grammar.compiled_tableaux[cache_key] = tableau_array(getattr(grammar, tableaux_name), consts)
+    return grammar.compiled_tableaux[cache_key]
+
+# num noisy versions of the ranking values of const_dict, in one (num x constraints) array.
+# The numpy generator is seeded from the random module, so random.seed makes the draws reproducible.
+def noisy_ranking_values(const_dict, num, noise_sigma=2.0, rng=None):
+    import numpy as np
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    ranking_values = np.array([const_dict[const] for const in const_dict.keys()], dtype=np.float64)
+    if noise_sigma == 0:
+        return np.tile(ranking_values, (num, 1))
+    return ranking_values + rng.normal(0, noise_sigma, (num, len(ranking_values)))
+
+# Batched Monte Carlo estimate of the output distribution of a learned grammar:
+# num_rankings noisy rankings are drawn at once, and every input's tableau is evaluated under all of them
+# with the vectorized EVAL of tableau_array.
+# Returns a dictionary from input to a Counter of how often each candidate won;
+# for RIP grammars the candidates are (overt form, parse) pairs.
+def sample_output_distribution(const_dict, grammar, num_rankings=1000, noise_sigma=2.0):
+    import numpy as np
+    rng = np.random.default_rng(random.getrandbits(64))
+    compiled = compile_grammar_tableaux(grammar)
+    noisy_values = noisy_ranking_values(const_dict, num_rankings, noise_sigma, rng)
+    distributions = {}
+    for key_id in range(len(compiled.keys)):
+        cands = compiled.cands[key_id]
+        win_counts = np.bincount(compiled.winners(noisy_values, key_id, rng), minlength=len(cands))
+        distributions[compiled.keys[key_id]] = collections.Counter()
+        for j in range(len(cands)):
+            if win_counts[j] > 0:
+                distributions[compiled.keys[key_id]][cands[j]] = int(win_counts[j])
+    return distributions
+
+# Tableau id (in the grammar's compiled i2o tableaux) of the input of each target type
+def target_key_ids(learning, types):
     used_grammar = learning.grammar
-    tableaux = used_grammar.i2o_tableaux
+    compiled = compile_grammar_tableaux(used_grammar)
+    key_ids = []
+    for t in types:
+        if hasattr(used_grammar, 'o2p_tableaux'):
+            key_ids.append(compiled.key_ids[make_input(t)])
+        else:
+            key_ids.append(compiled.key_ids[find_input(t, used_grammar.i2o_tableaux)[0]])
+    return key_ids
+
+# Evaluates the tableaux key_ids all at once, each under its own ranking
+# (noiseless unless noise_sigma is given; ties between equal ranking values are still broken at random).
+# Returns the learned forms, and for RIP grammars the learned parses (under the same rankings)
+# of the forms that differ from targets (of all forms, if no targets are given).
+# The learned parses are None where they were not needed, and for grammars that are not RIP.
+def evaluate_learned_forms(learning, key_ids, noise_sigma=0, targets=None):
+    import numpy as np
+    rng = np.random.default_rng(random.getrandbits(64))
+    num = len(key_ids)
+    compiled = compile_grammar_tableaux(learning.grammar)
+    noisy_values = noisy_ranking_values(learning.const_dict, num, noise_sigma, rng)
+    winners = compiled.winners(noisy_values, key_ids, rng)
+    learned_parses = [None]*num
+    if hasattr(learning.grammar, 'o2p_tableaux'):
+        learned_forms = [compiled.cands[key_ids[k]][winners[k]][0] for k in range(num)]
+        if targets is None:
+            parse_rows = list(range(num))
+        else:
+            parse_rows = [k for k in range(num) if learned_forms[k] != targets[k]]
+        o2p_compiled = compile_grammar_tableaux(learning.grammar, 'o2p_tableaux')
+        overt_ids = np.array([o2p_compiled.key_ids[learned_forms[k]] for k in parse_rows], dtype=np.int64)
+        parse_ids = o2p_compiled.winners(noisy_values[parse_rows], overt_ids, rng)
+        for e in range(len(parse_rows)):
+            learned_parses[parse_rows[e]] = o2p_compiled.cands[overt_ids[e]][parse_ids[e]]
+    else:
+        learned_forms = [compiled.cands[key_ids[k]][winners[k]] for k in range(num)]
+    return (learned_forms, learned_parses)
+
+# The target sampler and the tableau of each target type of a learned grammar.
+# Making them goes over the whole target list, so an evaluation in several blocks makes them once
+# and passes them to each sample_learned_forms call.
+class learned_form_sampler:
+    def __init__(self, learning):
+        import numpy as np
+        self.sampler = target_sampler(learning.target_list)
+        self.key_ids = np.array(target_key_ids(learning, self.sampler.types), dtype=np.int64)
+
+# Draws num target tokens and finds the form the learned grammar generates for each.
+# Returns the tokens, the learned forms and the learned parses of the wrongly learned forms
+# (None for correctly learned forms, and for grammars that are not RIP).
+def sample_learned_forms(learning, num, noise_sigma=0, form_sampler=None):
+    import numpy as np
+    if form_sampler is None:
+        form_sampler = learned_form_sampler(learning)
+    sampler = form_sampler.sampler
+    # Each call draws from the random module, so that random.seed makes every block reproducible
+    sampler.rng = np.random.default_rng(random.getrandbits(64))
+    drawn_ids = sampler.draw_ids(num)
+    key_ids = form_sampler.key_ids[drawn_ids]
+    targets = [sampler.types[i] for i in drawn_ids.tolist()]
+    learned_forms, learned_parses = evaluate_learned_forms(learning, key_ids, noise_sigma, targets)
+    return (targets, learned_forms, learned_parses)
+
+def eval_errors(learning, num, print_bool=True):
+    targets, learned_forms, learned_parses = sample_learned_forms(learning, num)
     error_list = []
-
-    i = 0
-    while i < num:
-        i += 1
-        t = random.sample(target_list, 1)[0]
-        learned_form = generate(find_input(t, tableaux)[0], ranked_consts, tableaux)[0]
+    for k in range(num):
+        t = targets[k]
+        learned_form = learned_forms[k]
         if learned_form != t:
-            print("Eval error: Learned "+learned_form+', target '+t)
+            if print_bool:
+                print("Eval error: Learned "+learned_form+', target '+t)
             error_compare = ' '.join([t, learned_form])
             error_list.append(error_compare)
     return error_list
 
-def eval_errors_RIP(learning, num):
-    target_list = learning.target_list
-    used_grammar = learning.grammar
-    i2o_tableaux = used_grammar.i2o_tableaux
-    o2p_tableaux = used_grammar.o2p_tableaux
+def eval_errors_RIP(learning, num, print_bool=True):
+    targets, learned_forms, learned_parses = sample_learned_forms(learning, num, 2.0)
     error_list = []
-
-    i=0
-    while i<num:
-        i += 1
-        const_dict = learning.const_dict
-        ranked_consts = ranking(add_noise(const_dict, 2.0))
-        t = random.sample(target_list, 1)[0]
-        learned_form = generate(make_input(t), ranked_consts, i2o_tableaux)[0][0]
+    for k in range(num):
+        t = targets[k]
+        learned_form = learned_forms[k]
         if learned_form != t:
-            print("Eval error: Learned "+learned_form+', target '+t)
-            learned_parse = generate(learned_form, ranked_consts, o2p_tableaux)[0]
-            error_compare = ' '.join([t, learned_form, learned_parse])
+            if print_bool:
+                print("Eval error: Learned "+learned_form+', target '+t)
+            error_compare = ' '.join([t, learned_form, learned_parses[k]])
             error_list.append(error_compare)
     return error_list
 
+# Confusion counts: how often each (target, learned form, learned parse) came out of evaluation.
+# Forms and parses are numbered as they come up, and the counts are kept by numbers,
+# so that each error costs a dictionary update rather than a string (or a line in a results file).
+# The learned parse is None for grammars that are not RIP (and for correctly learned forms).
+class confusion_counts:
+    def __init__(self):
+        self.forms = []
+        self.form_ids = {}
+        self.counts = collections.Counter()
+
+    def form_id(self, form):
+        if form is None:
+            return -1
+        if form not in self.form_ids:
+            self.form_ids[form] = len(self.forms)
+            self.forms.append(form)
+        return self.form_ids[form]
+
+    def add(self, target, learned_form, learned_parse=None, count=1):
+        self.counts[(self.form_id(target), self.form_id(learned_form), self.form_id(learned_parse))] += count
+
+    # Add the counts of another confusion_counts (e.g. from another worker)
+    def update(self, other):
+        for (target_id, form_id, parse_id), count in other.counts.items():
+            self.add(other.form(target_id), other.form(form_id), other.form(parse_id), count)
+
+    def form(self, form_id):
+        if form_id == -1:
+            return None
+        return self.forms[form_id]
+
+    def __len__(self):
+        return len(self.counts)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    # The k most frequent confusions (all of them if k is None), as ((target, learned form, learned parse), count) pairs
+    def most_common(self, k=None):
+        top = []
+        for (target_id, form_id, parse_id), count in self.counts.most_common(k):
+            top.append(((self.form(target_id), self.form(form_id), self.form(parse_id)), count))
+        return top
+
+    # Compact representation for JSON: the forms once, and one [target, learned form, learned parse, count] row of numbers per confusion
+    def to_json(self):
+        rows = [[target_id, form_id, parse_id, count] for (target_id, form_id, parse_id), count in self.counts.items()]
+        return {'forms': self.forms, 'counts': rows}
+
+    def write(self, json_path):
+        json_file = open(json_path, 'w', encoding='utf-8')
+        json.dump(self.to_json(), json_file)
+        json_file.close()
+
+def confusions_from_json(data):
+    confusions = confusion_counts()
+    for form in data['forms']:
+        confusions.form_id(form)
+    for target_id, form_id, parse_id, count in data['counts']:
+        confusions.counts[(target_id, form_id, parse_id)] += count
+    return confusions
+
+def read_confusions(json_path):
+    json_file = open(json_path, 'r', encoding='utf-8')
+    data = json.load(json_file)
+    json_file.close()
+    return confusions_from_json(data)
+
+# Confusion counts of num target tokens drawn by frequency
+# (evaluation noise as in do_adaptive_evaluation)
+def eval_confusions(learning, num, noise_sigma=None, form_sampler=None):
+    if noise_sigma is None:
+        noise_sigma = eval_noise_sigma(learning)
+    targets, learned_forms, learned_parses = sample_learned_forms(learning, num, noise_sigma, form_sampler)
+    confusions = confusion_counts()
+    for k in range(num):
+        if learned_forms[k] != targets[k]:
+            confusions.add(targets[k], learned_forms[k], learned_parses[k])
+    return confusions
+
+# Evaluation noise used when none is given: 2.0 for RIP grammars and none otherwise (as in eval_errors_RIP and eval_errors)
+def eval_noise_sigma(learning):
+    if hasattr(learning.grammar, 'o2p_tableaux'):
+        return 2.0
+    else:
+        return 0
+
+# Wilson score interval for an error rate of errors out of num evaluations, at the given confidence level
+def wilson_interval(errors, num, confidence=0.95):
+    if num == 0:
+        return (0.0, 1.0)
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence/2)
+    p = errors/num
+    denominator = 1 + z*z/num
+    center = (p + z*z/(2*num))/denominator
+    half_width = z*math.sqrt(p*(1-p)/num + z*z/(4*num*num))/denominator
+    return (max(0.0, center-half_width), min(1.0, center+half_width))
+
+# Adaptive evaluation: instead of a fixed number of evaluations,
+# tokens are drawn and evaluated block_size at a time until the error rate of every target form
+# is known to within +-tolerance (the half-width of its Wilson interval), or budget evaluations have been made.
+# Evaluation noise is as in eval_noise_sigma, unless noise_sigma is given.
+# Returns the number of evaluations, the evaluations and errors per target form, the interval of each form,
+# whether all intervals got within the tolerance, and the confusion counts of the errors.
+def do_adaptive_evaluation(learning, tolerance=0.02, block_size=1000, budget=100000, confidence=0.95, noise_sigma=None):
+    if noise_sigma is None:
+        noise_sigma = eval_noise_sigma(learning)
+    types = target_types(learning.target_list)
+    eval_counts = dict.fromkeys(types, 0)
+    error_counts = dict.fromkeys(types, 0)
+    errors = confusion_counts()
+    form_sampler = learned_form_sampler(learning)
+
+    num_of_evals = 0
+    converged = False
+    while num_of_evals < budget and not converged:
+        num = min(block_size, budget-num_of_evals)
+        targets, learned_forms, learned_parses = sample_learned_forms(learning, num, noise_sigma, form_sampler)
+        for k in range(num):
+            eval_counts[targets[k]] += 1
+            if learned_forms[k] != targets[k]:
+                error_counts[targets[k]] += 1
+                errors.add(targets[k], learned_forms[k], learned_parses[k])
+        num_of_evals += num
+
+        intervals = {}
+        for t in types:
+            intervals[t] = wilson_interval(error_counts[t], eval_counts[t], confidence)
+        converged = all([(high-low)/2 <= tolerance for (low, high) in intervals.values()])
+
+    return (num_of_evals, eval_counts, error_counts, intervals, converged, errors)
+
+# Common to the evaluation classes below
+class evaluation_results:
+    # Error rate of each target form, over the evaluations of that form
+    def error_rates(self):
+        rates = {}
+        for t in self.eval_counts.keys():
+            if self.eval_counts[t] > 0:
+                rates[t] = self.error_counts[t]/self.eval_counts[t]
+        return rates
+
+class adaptive_evaluation(evaluation_results):
+    def __init__(self, learning, tolerance=0.02, block_size=1000, budget=100000, confidence=0.95, noise_sigma=None):
+        results = do_adaptive_evaluation(learning, tolerance, block_size, budget, confidence, noise_sigma)
+        self.num_of_evals = results[0]
+        self.eval_counts = results[1]
+        self.error_counts = results[2]
+        self.intervals = results[3]
+        self.converged = results[4]
+        self.errors = results[5]
+        self.tolerance = tolerance
+        self.confidence = confidence
+
+# Stratified evaluation: instead of drawing tokens by frequency (so that rare forms are barely tested),
+# every distinct input is evaluated evals_per_input times, and every target form of that input is scored
+# on those evaluations. The overall error rate is then reweighted by the corpus frequency of each target form.
+# The evaluations are noisy (noise_sigma 2.0 unless it is given, as in eval_errors_RIP), for RIP and other grammars alike.
+# With noise_sigma 0, every evaluation of an input would give the same form,
+# so each input is evaluated only once, and no intervals are given (they are None).
+# Returns the number of evaluations, the evaluations and errors per target form, the interval of each form,
+# the frequency-weighted error rate, the confusion counts of the errors, and the number of evaluations per input.
+def do_stratified_evaluation(learning, evals_per_input=1000, confidence=0.95, noise_sigma=None):
+    import numpy as np
+    if noise_sigma is None:
+        noise_sigma = 2.0
+    if noise_sigma == 0:
+        evals_per_input = 1
+    target_list = learning.target_list
+    if isinstance(target_list, list):
+        type_counts = collections.Counter(target_list)
+        types = list(type_counts.keys())
+        counts = list(type_counts.values())
+    else:
+        types = list(target_list.types)
+        counts = list(target_list.counts)
+
+    # The target forms of each distinct input
+    type_key_ids = target_key_ids(learning, types)
+    key_types = {}
+    for i in range(len(types)):
+        key_types.setdefault(type_key_ids[i], []).append(types[i])
+    key_ids = np.repeat(list(key_types.keys()), evals_per_input)
+    learned_forms, learned_parses = evaluate_learned_forms(learning, key_ids, noise_sigma)
+
+    eval_counts = {}
+    error_counts = {}
+    errors = confusion_counts()
+    for t in types:
+        eval_counts[t] = evals_per_input
+        error_counts[t] = 0
+    for k in range(len(key_ids)):
+        for t in key_types[key_ids[k]]:
+            if learned_forms[k] != t:
+                error_counts[t] += 1
+                errors.add(t, learned_forms[k], learned_parses[k])
+
+    intervals = {}
+    weighted_error_rate = 0.0
+    for i in range(len(types)):
+        t = types[i]
+        if noise_sigma == 0:
+            intervals[t] = None
+        else:
+            intervals[t] = wilson_interval(error_counts[t], evals_per_input, confidence)
+        weighted_error_rate += counts[i]/sum(counts)*error_counts[t]/evals_per_input
+
+    return (len(key_ids), eval_counts, error_counts, intervals, weighted_error_rate, errors, evals_per_input)
+
+class stratified_evaluation(evaluation_results):
+    def __init__(self, learning, evals_per_input=1000, confidence=0.95, noise_sigma=None):
+        results = do_stratified_evaluation(learning, evals_per_input, confidence, noise_sigma)
+        self.num_of_evals = results[0]
+        self.eval_counts = results[1]
+        self.error_counts = results[2]
+        self.intervals = results[3]
+        self.weighted_error_rate = results[4]
+        self.errors = results[5]
+        self.evals_per_input = results[6]
+        self.confidence = confidence
+
+# Exact output probabilities of a stochastic OT grammar.
+# With noise, the ranking values are independent normal variables (means: the ranking values, sd: noise_sigma),
+# and a candidate wins when the constraints come out in an order under which it is optimal.
+# Going down such an order, only the constraints that tell the surviving candidates apart matter,
+# so the orders are followed top down as a tree of (surviving candidates) states,
+# branching on which of the constraints that still tell the survivors apart comes highest.
+# Constraints that stop mattering at a step only need to be ranked below the constraint taken at that step.
+# The probability of each branch (a multivariate normal orthant probability) is integrated numerically:
+# a state keeps the density of the value of its last constraint on a grid of grid_size points
+# around the ranking value of each constraint that tells the candidates apart (width standard deviations each way).
+# If candidates are tied on every constraint, the first one wins (as in tableau_array).
+# Returns a dictionary from candidate to probability.
+def tableau_output_distribution(tableau, const_dict, noise_sigma=2.0, grid_size=2001, width=8.0):
+    import numpy as np
+    cands = list(tableau.keys())
+    distribution = {}
+    for cand in cands:
+        distribution[cand] = 0.0
+
+    # Constraints that tell apart (some of) the given candidates
+    def distinguishing(survivors):
+        return [const for const in const_dict.keys() if len(set([tableau[cand][const] for cand in survivors])) > 1]
+
+    if noise_sigma == 0:
+        distribution[generate_from(tableau, ranking(const_dict))] = 1.0
+        return distribution
+
+    if len(distinguishing(cands)) == 0:
+        distribution[cands[0]] = 1.0
+        return distribution
+
+    # The grid covers width*noise_sigma on each side of the mean of each constraint that matters here,
+    # with at least 4 points per noise_sigma, however far apart the means are;
+    # between these windows every density is negligible, so the gaps are left out.
+    window_size = max(grid_size, int(math.ceil(2*width*4))+1)
+    x = np.unique(np.concatenate([np.linspace(const_dict[const]-width*noise_sigma, const_dict[const]+width*noise_sigma, window_size) for const in distinguishing(cands)]))
+    dx = np.diff(x)
+    densities = {}
+    cumulatives = {}
+    for const in distinguishing(cands):
+        z = (x - const_dict[const])/noise_sigma
+        densities[const] = np.exp(-z*z/2)/(noise_sigma*math.sqrt(2*math.pi))
+        cumulatives[const] = np.array([0.5*(1+math.erf(v/math.sqrt(2))) for v in z])
+
+    # Probability that the value of the last constraint taken is above each grid point
+    def upper_tail(density):
+        tail = np.zeros(len(x))
+        tail[:-1] = np.cumsum(((density[1:]+density[:-1])*dx/2)[::-1])[::-1]
+        return tail
+
+    # states: surviving candidates -> density of the last constraint taken (None at the start: nothing taken yet)
+    states = {tuple(cands): None}
+    while len(states) > 0:
+        # Candidates only get eliminated, so states with the most survivors come first
+        survivors = max(states.keys(), key=len)
+        density = states.pop(survivors)
+        remaining = distinguishing(survivors)
+        if len(remaining) == 0:
+            if density is None:
+                distribution[survivors[0]] += 1.0
+            else:
+                distribution[survivors[0]] += float(((density[1:]+density[:-1])*dx/2).sum())
+            continue
+        if density is None:
+            tail = np.ones(len(x))
+        else:
+            tail = upper_tail(density)
+        for const in remaining:
+            fewest = min([tableau[cand][const] for cand in survivors])
+            next_survivors = tuple([cand for cand in survivors if tableau[cand][const] == fewest])
+            next_density = densities[const]*tail
+            for dropped in set(remaining).difference(distinguishing(next_survivors)).difference([const]):
+                next_density = next_density*cumulatives[dropped]
+            if next_survivors in states:
+                states[next_survivors] = states[next_survivors] + next_density
+            else:
+                states[next_survivors] = next_density
+
+    total = sum(distribution.values())
+    if abs(total - 1.0) > 1e-3:
+        raise ValueError("Output probabilities sum to "+str(total)+" instead of 1; use a larger grid_size.")
+    return distribution
+
+# Winning candidate of a tableau under a ranking (generate, for a tableau rather than an input)
+def generate_from(tableau, ranked_consts):
+    return generate(None, ranked_consts, {None: tableau})[0]
+
+# Exact output probabilities of every input of a learned grammar, under evaluation noise noise_sigma.
+# Returns a dictionary from input to a dictionary from candidate to probability;
+# for RIP grammars the candidates are (overt form, parse) pairs.
+# The result is cached on the learning object, for each set of ranking values and noise_sigma.
+def output_distribution(learning, noise_sigma=2.0, grid_size=2001):
+    const_dict = learning.const_dict
+    cache_key = (tuple([(const, const_dict[const]) for const in const_dict.keys()]), noise_sigma, grid_size)
+    if cache_key not in learning.output_distributions:
+        i2o_tableaux = learning.grammar.i2o_tableaux
+        distributions = {}
+        for inp in i2o_tableaux.keys():
+            distributions[inp] = tableau_output_distribution(i2o_tableaux[inp], const_dict, noise_sigma, grid_size)
+        learning.output_distributions[cache_key] = distributions
+    return learning.output_distributions[cache_key]
+
+# Exact probability, for each target type, that the learned grammar generates a different overt form
+# (what eval_errors and eval_errors_RIP estimate by sampling)
+def expected_error_rates(learning, noise_sigma=2.0, grid_size=2001):
+    distributions = output_distribution(learning, noise_sigma, grid_size)
+    i2o_tableaux = learning.grammar.i2o_tableaux
+    is_RIP = hasattr(learning.grammar, 'o2p_tableaux')
+    error_rates = {}
+    for t in target_types(learning.target_list):
+        if is_RIP:
+            distribution = distributions[make_input(t)]
+            correct = sum([distribution[cand] for cand in distribution.keys() if cand[0] == t])
+        else:
+            distribution = distributions[find_input(t, i2o_tableaux)[0]]
+            correct = distribution[t]
+        error_rates[t] = max(0.0, 1.0 - correct)
+    return error_rates
+
+
+# Min/max decimation of a trajectory for plotting.
+# A line plot cannot show more than a couple of points per pixel column anyway,
+# so the trajectory is cut into max_points/2 equal stretches and only the lowest and highest point of each is kept
+# (in their original order), which keeps every spike visible.
+# Returns the positions (0-based) and values of the points kept; short trajectories are returned whole.
+def decimate_track(track, max_points=2000):
+    import numpy as np
+    values = np.asarray(track, dtype=np.float64)
+    if max_points is None or len(values) <= max_points:
+        return (np.arange(len(values)), values)
+    num_bins = max_points//2
+    bin_size = -(-len(values)//num_bins)
+    padded = np.full(num_bins*bin_size, np.nan)
+    padded[:len(values)] = values
+    padded = padded.reshape(num_bins, bin_size)
+    # Only the last stretch can be partly padding, and it always has at least one point
+    num_bins = -(-len(values)//bin_size)
+    padded = padded[:num_bins]
+    offsets = np.arange(num_bins)*bin_size
+    positions = np.unique(np.concatenate([offsets+np.nanargmin(padded, axis=1), offsets+np.nanargmax(padded, axis=1)]))
+    return (positions, values[positions])
+
+# matplotlib is only imported here, so that learning (and worker processes that never plot) does not load it.
+# headless=True uses the Agg backend, which needs no display (for batch jobs); the figure must then be saved.
+# Trajectories longer than max_points are decimated (see decimate_track; None plots every point).
+# file_format is that of the saved figure: 'svg', or e.g. 'png' (much smaller and faster for long runs).
+# The figure is saved to a timestamped file in the results folder, unless figure_file_path is given.
+def plot_results(learning_result, plot_rvs=True, plot_learning=True, plot_intervals=True, save=True, headless=False, max_points=2000, file_format='svg', figure_file_path=None):
+    if headless and not save:
+        raise ValueError("A headless plot cannot be shown; it has to be saved.")
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
 
-def plot_results(learning_result, plot_rvs=True, plot_learning=True, plot_intervals=True, save=True):
-    num_of_data = learning_result.num_of_data
-    iteration_track = list(range(1, num_of_data+1))
     ranking_value_tracks = learning_result.ranking_value_tracks
     learning_track = learning_result.learning_track
     interval_track = learning_result.interval_track
@@ -837,27 +2814,32 @@ def plot_results(learning_result, plot_rvs=True, plot_learning=True, plot_interv
         if p == 'rvs':
             plt.subplot(len(list_of_plots), 1, list_of_plots.index(p)+1)
             for const in ranking_value_tracks.keys():
-                plt.plot(iteration_track, ranking_value_tracks[const])
+                positions, values = decimate_track(ranking_value_tracks[const], max_points)
+                # Iterations are numbered from 1
+                plt.plot(positions+1, values)
         elif p == 'learning':
             plt.subplot(len(list_of_plots), 1, list_of_plots.index(p)+1)
-            plt.plot(iteration_track, learning_track)
+            positions, values = decimate_track(learning_track, max_points)
+            plt.plot(positions+1, values)
         elif p == 'intervals':
-            intervals = []
-            changes = []
-            for i in range(0, len(interval_track)-1):
-                intervals.append(interval_track[i+1]-interval_track[i])
-                changes.append(i+1)
+            # Interval between each change and the next, numbered by change
+            intervals = np.diff(np.asarray(interval_track, dtype=np.int64))
+            positions, values = decimate_track(intervals, max_points)
             plt.subplot(len(list_of_plots), 1, list_of_plots.index(p)+1)
-            plt.plot(changes, intervals)
+            plt.plot(positions+1, values)
     
     if save==True:
-        figure_file_path = timestamp_filepath('svg', 'hypo02')
+        if figure_file_path is None:
+            figure_file_path = timestamp_filepath(file_format, 'hypo02')
         plt.savefig(figure_file_path)
         print("Figure file: "+figure_file_path)
+        if headless:
+            plt.close()
     else:
         plt.show()
 
-def write_results(learning_result, is_RIP=None):
+# If records_path is given, the results (with the same evaluation) are also appended there as a JSON record (see write_results_record).
+def write_results(learning_result, is_RIP=None, eval_tolerance=0.02, eval_budget=100000, evals_per_input=None, top_errors=20, records_path=None):
     const_dict = learning_result.const_dict
     change_counter = learning_result.change_counter
     num_of_data = learning_result.num_of_data
@@ -881,6 +2863,10 @@ def write_results(learning_result, is_RIP=None):
     # Write how many times the grammar was changed
     results_file.write("Grammar changed "+str(change_counter)+"/"+str(num_of_data)+" times\n")
 
+    # Write where and why learning stopped, if it stopped early
+    if learning_result.stopped_at is not None:
+        results_file.write("Stopped early after "+str(learning_result.stopped_at)+" data: "+learning_result.stop_reason+"\n")
+
     # Write plasticity and noise settings
     results_file.write("Plasticity: "+str(plasticity)+"\n")
     if noise_bool == True:
@@ -898,18 +2884,47 @@ def write_results(learning_result, is_RIP=None):
         results_file.write("Overt forms that were never learned:")
         for i in failed_set:
             results_file.write(str(i)+"\n")
-    
-    if is_RIP == True:
-        errors = eval_errors_RIP(learning_result, 1000)
+
+    # Write how often each datum type was generated wrongly during learning
+    if len(learning_result.type_error_rates) > 0:
+        results_file.write("\nError rates during learning (overt form, errors/tokens):\n")
+        type_counts = learning_result.type_counts
+        for i in range(len(type_counts.types)):
+            seen = type_counts.learned[i] + type_counts.failed[i]
+            if seen > 0:
+                results_file.write(type_counts.types[i]+"\t"+str(type_counts.failed[i])+"/"+str(seen)+"\t"+str(round(type_counts.failed[i]/seen, 4))+"\n")
+
+    # Evaluate adaptively, or evals_per_input times per input if that is given
+    if evals_per_input is None:
+        evaluation = adaptive_evaluation(learning_result, eval_tolerance, budget=eval_budget)
+        results_file.write("\nEvaluated "+str(evaluation.num_of_evals)+" tokens")
+        if evaluation.converged:
+            results_file.write(" (all error rates within +-"+str(eval_tolerance)+")\n")
+        else:
+            results_file.write(" (budget reached before all error rates were within +-"+str(eval_tolerance)+")\n")
     else:
-        errors = eval_errors(learning_result, 1000)
-    
+        evaluation = stratified_evaluation(learning_result, evals_per_input)
+        results_file.write("\nEvaluated each input "+str(evaluation.evals_per_input)+" times\n")
+        results_file.write("Error rate weighted by corpus frequency: "+str(round(evaluation.weighted_error_rate, 4))+"\n")
+    errors = evaluation.errors
+
+    results_file.write("Error rates in evaluation (overt form, errors/tokens, "+str(int(evaluation.confidence*100))+"% interval):\n")
+    for t in evaluation.eval_counts.keys():
+        if evaluation.intervals[t] is None:
+            results_file.write(t+"\t"+str(evaluation.error_counts[t])+"/"+str(evaluation.eval_counts[t])+"\t(no interval)\n")
+        else:
+            low, high = evaluation.intervals[t]
+            results_file.write(t+"\t"+str(evaluation.error_counts[t])+"/"+str(evaluation.eval_counts[t])+"\t["+str(round(low, 4))+", "+str(round(high, 4))+"]\n")
+
     if len(errors) == 0:
         results_file.write("\nNo errors found in evaluation")
     elif len(errors) > 0:
-        results_file.write("\n"+str(len(errors))+" errors found in evaluation (target, learned form, (learned parse)):\n")
-        for e in errors:
-            results_file.write(e+"\n")
+        results_file.write("\n"+str(errors.total())+" errors found in evaluation, "+str(len(errors))+" different ones")
+        if top_errors is not None and len(errors) > top_errors:
+            results_file.write(", the "+str(top_errors)+" most frequent shown")
+        results_file.write(" (target, learned form, (learned parse), count):\n")
+        for confusion, count in errors.most_common(top_errors):
+            results_file.write(' '.join([x for x in confusion if x is not None])+"\t"+str(count)+"\n")
 
     #results_file.write("\nError chews:\n")
     #interval_track_string = [str(x) for x in interval_track]
@@ -919,6 +2934,96 @@ def write_results(learning_result, is_RIP=None):
     results_file.close()
     print("Output file: "+results_file_path)    
 
+    if records_path is not None:
+        write_results_record(learning_result, records_path, is_RIP, evaluation)
+
+# Machine-readable results: one JSON record per run, with
+# the learner and its parameters (schedules are given by their repr), the amount of data and grammar changes,
+# where and why learning stopped, the final ranking values, the learned and failed counts of each target form,
+# and the evaluation (per-form counts and the confusion counts of the errors; see confusion_counts.to_json).
+# metadata is an optional dictionary of anything else to keep with the run (e.g. grammar and target file names).
+# evaluation is an adaptive_evaluation or stratified_evaluation of the run; an adaptive_evaluation is made if it is not given.
+def results_record(learning_result, is_RIP=None, evaluation=None, metadata=None):
+    if evaluation is None:
+        evaluation = adaptive_evaluation(learning_result)
+    if is_RIP is None:
+        is_RIP = hasattr(learning_result.grammar, 'o2p_tableaux')
+
+    params = {}
+    for param in ['plasticity', 'noise_bool', 'noise_sigma', 'batch', 'minibatch_size', 'draw', 'processes']:
+        if hasattr(learning_result, param):
+            value = getattr(learning_result, param)
+            if isinstance(value, schedule):
+                value = repr(value)
+            params[param] = value
+
+    type_counts = learning_result.type_counts
+    record = {'time': datetime.datetime.now().isoformat(timespec='seconds'),
+              'learner': type(learning_result).__name__,
+              'is_RIP': is_RIP,
+              'params': params,
+              'metadata': metadata or {},
+              'num_of_data': learning_result.num_of_data,
+              'change_counter': learning_result.change_counter,
+              'stopped_at': learning_result.stopped_at,
+              'stop_reason': learning_result.stop_reason,
+              'ranking_values': dict(learning_result.const_dict),
+              'failed_forms': sorted(learning_result.failed_set),
+              'type_counts': {'types': type_counts.types, 'learned': type_counts.learned, 'failed': type_counts.failed},
+              'evaluation': {'method': type(evaluation).__name__,
+                             'num_of_evals': evaluation.num_of_evals,
+                             'num_of_errors': evaluation.errors.total(),
+                             'eval_counts': evaluation.eval_counts,
+                             'error_counts': evaluation.error_counts,
+                             'confusions': evaluation.errors.to_json()},
+              'track_path': learning_result.track_path}
+    return record
+
+# Append the results record of a run to records_path (a JSON-lines file), written out to disk at once,
+# so that the records of thousands of runs can be collected in one file, and read back with read_results_records.
+def write_results_record(learning_result, records_path, is_RIP=None, evaluation=None, metadata=None):
+    record = results_record(learning_result, is_RIP, evaluation, metadata)
+    records_file = open(records_path, 'a', encoding='utf-8')
+    records_file.write(json.dumps(record)+"\n")
+    records_file.flush()
+    os.fsync(records_file.fileno())
+    records_file.close()
+    return record
+
+def read_results_records(records_path):
+    records = []
+    records_file = open(records_path, 'r', encoding='utf-8')
+    for line in records_file:
+        line = line.strip()
+        if line:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A record cut off by an interruption
+                continue
+    records_file.close()
+    return records
+
+# One flat row (a dictionary of plain values) for a results record, for tables:
+# the run information, the parameters and metadata, and then one column per constraint (its final ranking value).
+def results_row(record):
+    row = {'time': record['time'],
+           'learner': record['learner'],
+           'is_RIP': record['is_RIP']}
+    for key, value in record['metadata'].items():
+        row[key] = value
+    for key, value in record['params'].items():
+        row[key] = value
+    row['num_of_data'] = record['num_of_data']
+    row['change_counter'] = record['change_counter']
+    row['stopped_at'] = record['stopped_at']
+    row['failed_forms'] = len(record['failed_forms'])
+    row['eval_num'] = record['evaluation']['num_of_evals']
+    row['eval_errors'] = record['evaluation']['num_of_errors']
+    for const, value in record['ranking_values'].items():
+        row[const] = value
+    return row
+
 
 
 if __name__ == "__main__":
@@ -2,6 +2,11 @@ import re
 import random
 import sys
 import datetime
+import os
+
+# Pass "binary" as a second argument to also write the data as a binary target file
+# (<name>.vocab and <name>.npy; see target_tokens in gla.py)
+binary_bool = len(sys.argv) > 2 and sys.argv[2] == "binary"
 
 keyword = input("Label to apply to data file (Press enter to skip):")
 keyword = keyword.rstrip()
@@ -30,12 +35,21 @@ overts = input_file.readlines()
 
 pattern = re.compile("(\[.*\])\t(\d+)")
 
+vocab = []
+vocab_ids = {}
+token_blocks = []
+
 for l in overts:
     match = re.findall(pattern, l)
     overt = match[0][0]
     count = match[0][1]
     count = int(count)
 
+    if overt not in vocab_ids:
+        vocab_ids[overt] = len(vocab)
+        vocab.append(overt)
+    token_blocks.append((vocab_ids[overt], count))
+
     i=0
     while i<count:
         output_file.write(overt+"\n")
@@ -44,3 +58,10 @@ for l in overts:
 input_file.close()
 output_file.close()
 
+if binary_bool:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import gla
+    import numpy as np
+    token_ids = np.repeat([b[0] for b in token_blocks], [b[1] for b in token_blocks])
+    gla.write_binary_targets(data_file_name[:-4], vocab, token_ids)
+
@@ -0,0 +1,137 @@
+##### Batch plotting of saved trajectories
+# Renders a figure for every run whose trajectories were saved to disk
+# (with track_path in gla, or --track-dir in replicate.py and sweep.py), in a pool of worker processes,
+# so that plotting does not hold up learning.
+# Only finished trajectories are plotted (those with a _done.txt file, see gla.track_done_path),
+# and runs that already have an up-to-date figure are skipped.
+# With --watch, the folder is scanned again and again, so the command can run in the background
+# while learners are still writing trajectories, and plots each run as soon as it finishes.
+#
+# Usage: python plot_pool.py track_dir [--watch] [--format png] [--processes N]
+# (see python plot_pool.py --help for the options)
+
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+
+import gla
+
+##### Worker processes #########################################################
+
+def init_worker():
+    # Workers never show figures, so they all use the headless backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+# What plot_results needs to know about a run
+class saved_run:
+    def __init__(self, track_path):
+        self.ranking_value_tracks, self.learning_track, self.interval_track = gla.load_tracks(track_path)
+
+def plot_one(task):
+    track_path, figure_path, max_points = task
+    gla.plot_results(saved_run(track_path), save=True, headless=True, max_points=max_points, figure_file_path=figure_path)
+    return figure_path
+
+##### Finding runs to plot #####################################################
+
+def figure_path_of(track_path, file_format):
+    return track_path+'.'+file_format
+
+# Track paths of the finished runs in track_dir that have no figure yet, or an older one than their trajectories
+def runs_to_plot(track_dir, file_format):
+    suffix = '_done.txt'
+    track_paths = []
+    for done_path in sorted(glob.glob(os.path.join(track_dir, '*'+suffix))):
+        track_path = done_path[:-len(suffix)]
+        figure_path = figure_path_of(track_path, file_format)
+        if not os.path.exists(figure_path) or os.path.getmtime(figure_path) < os.path.getmtime(done_path):
+            track_paths.append(track_path)
+    return track_paths
+
+# Time of the run's _done.txt file (0 if it has gone, e.g. because the run was started again)
+def done_time(track_path):
+    try:
+        return os.path.getmtime(gla.track_done_path(track_path))
+    except OSError:
+        return 0
+
+##### Plotting #################################################################
+
+# Plot every finished run in track_dir once. Returns the paths of the figures made.
+def plot_all(track_dir, file_format='png', max_points=2000, processes=None):
+    if processes is None:
+        processes = os.cpu_count()
+    tasks = [(track_path, figure_path_of(track_path, file_format), max_points) for track_path in runs_to_plot(track_dir, file_format)]
+    if len(tasks) == 0:
+        return []
+    pool = multiprocessing.Pool(processes, init_worker)
+    try:
+        figure_paths = list(pool.imap_unordered(plot_one, tasks))
+    finally:
+        pool.close()
+        pool.join()
+    return figure_paths
+
+# Keep plotting runs in track_dir as they finish, checking every poll_interval seconds.
+# Stops after idle_limit seconds without new runs (never, if idle_limit is None).
+# A run that cannot be plotted (e.g. a corrupt track) is reported and skipped,
+# until its trajectories are written again (its _done.txt file is newer than the failure).
+# Returns the paths of the figures made.
+def watch(track_dir, file_format='png', max_points=2000, processes=None, poll_interval=10, idle_limit=None):
+    if processes is None:
+        processes = os.cpu_count()
+    pool = multiprocessing.Pool(processes, init_worker)
+    figure_paths = []
+    # Runs handed to the pool and not yet plotted
+    pending = {}
+    # Runs that failed, and the time of their _done.txt file when they did
+    failed = {}
+    idle_since = time.time()
+    try:
+        while True:
+            for track_path in list(pending.keys()):
+                if pending[track_path].ready():
+                    result = pending.pop(track_path)
+                    try:
+                        figure_paths.append(result.get())
+                    except Exception as error:
+                        print("Could not plot "+track_path+": "+repr(error))
+                        failed[track_path] = done_time(track_path)
+            for track_path in runs_to_plot(track_dir, file_format):
+                if track_path in failed and done_time(track_path) <= failed[track_path]:
+                    continue
+                if track_path not in pending:
+                    failed.pop(track_path, None)
+                    pending[track_path] = pool.apply_async(plot_one, ((track_path, figure_path_of(track_path, file_format), max_points),))
+            if len(pending) > 0:
+                idle_since = time.time()
+            elif idle_limit is not None and time.time() - idle_since > idle_limit:
+                break
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        pool.join()
+    return figure_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot saved GLA trajectories in parallel.")
+    parser.add_argument('track_dir', help="folder with saved trajectories")
+    parser.add_argument('--format', default='png', help="figure file format (default: png)")
+    parser.add_argument('--max-points', type=int, default=2000, help="points per line after decimation")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--watch', action='store_true', help="keep plotting runs as they finish")
+    parser.add_argument('--poll-interval', type=float, default=10, help="seconds between scans with --watch")
+    parser.add_argument('--idle-limit', type=float, default=None, help="with --watch, stop after this many seconds without new runs")
+    args = parser.parse_args()
+
+    if args.watch:
+        figure_paths = watch(args.track_dir, args.format, args.max_points, args.processes, args.poll_interval, args.idle_limit)
+    else:
+        figure_paths = plot_all(args.track_dir, args.format, args.max_points, args.processes)
+    print(str(len(figure_paths))+" figures made")
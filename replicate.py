@@ -0,0 +1,141 @@
+##### Replication runner for the GLA
+# Runs the same learning simulation with many random seeds in a pool of worker processes,
+# and aggregates the results of all runs into one table
+# (final ranking values, number of grammar changes, evaluation errors),
+# instead of writing one results file per run and merging them afterwards (see aggregate_results.py).
+#
+# Usage: python replicate.py grammar_file target_file num_seeds [options]
+# (see python replicate.py --help for the options)
+
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+
+import gla
+
+##### Worker processes #########################################################
+
+# Each worker parses the grammar and reads the target file once, when it starts,
+# and keeps them here for all the runs it is given.
+worker_grammar = None
+worker_target_list = None
+worker_is_RIP = False
+# A target file that does not fit the grammar is reported by the worker's first task
+# (an error in init_worker itself would only make the pool start new workers over and over)
+worker_error = None
+
+def init_worker(grammar_file, target_file, is_RIP):
+    global worker_grammar, worker_target_list, worker_is_RIP, worker_error
+    grammar_text = gla.grammar_string(grammar_file)
+    if is_RIP:
+        worker_grammar = gla.grammar_RIP(grammar_text)
+    else:
+        worker_grammar = gla.grammar(grammar_text)
+    try:
+        worker_target_list = gla.read_targets(target_file, worker_grammar)
+    except ValueError as error:
+        worker_error = error
+    worker_is_RIP = is_RIP
+
+# Learn (and evaluate) with one seed and one set of learner parameters.
+# params is a dictionary with the keys plasticity, noise_bool, noise_sigma, batch, init_value and eval_num.
+# (batch is only used for RIP; if it is None, learning_RIP is used instead of batch_learnig_RIP.)
+# If params also has a track_path, the trajectories are saved there (see gla.make_tracks), e.g. for plot_pool.py.
+# Returns one row of the results table.
+def run_one(seed, params):
+    if worker_error is not None:
+        raise worker_error
+    random.seed(seed)
+    # The worker's grammar is shared by all its runs, so each run learns on its own copy of the ranking values
+    grammar = gla.copy_grammar(worker_grammar, params['init_value'])
+    track_path = params.get('track_path')
+
+    if worker_is_RIP and params['batch'] is not None:
+        result = gla.batch_learnig_RIP(worker_target_list, grammar, params['batch'], params['plasticity'], params['noise_bool'], params['noise_sigma'], print_bool=False, track_path=track_path)
+    elif worker_is_RIP:
+        result = gla.learning_RIP(worker_target_list, grammar, params['plasticity'], params['noise_bool'], params['noise_sigma'], print_bool=False, track_path=track_path)
+    else:
+        result = gla.learning(worker_target_list, grammar, params['plasticity'], params['noise_bool'], params['noise_sigma'], print_bool=False, track_path=track_path)
+
+    if worker_is_RIP:
+        errors = gla.eval_errors_RIP(result, params['eval_num'], print_bool=False)
+    else:
+        errors = gla.eval_errors(result, params['eval_num'], print_bool=False)
+
+    row = {'seed': seed,
+           'num_of_data': result.num_of_data,
+           'change_counter': result.change_counter,
+           'eval_num': params['eval_num'],
+           'eval_errors': len(errors)}
+    for const in result.const_dict.keys():
+        row[const] = result.const_dict[const]
+    return row
+
+def run_task(task):
+    return run_one(task[0], task[1])
+
+##### Running and aggregating ##################################################
+
+# seeds is a list of seeds, or a number of seeds (in which case the seeds are 0, 1, 2, ...).
+# processes defaults to the number of cores.
+# If track_dir is given, the trajectories of each run are saved there, as seed<seed>_*.npy.
+# Returns the rows of the results table, one per seed, in the order of seeds.
+def run_replications(grammar_file, target_file, seeds, is_RIP=False, batch=None, plasticity=1.0, noise_bool=True, noise_sigma=2.0, init_value=100, eval_num=1000, processes=None, track_dir=None):
+    if isinstance(seeds, int):
+        seeds = list(range(seeds))
+    if processes is None:
+        processes = os.cpu_count()
+    params = {'plasticity': plasticity, 'noise_bool': noise_bool, 'noise_sigma': noise_sigma,
+              'batch': batch, 'init_value': init_value, 'eval_num': eval_num}
+    tasks = []
+    for seed in seeds:
+        seed_params = dict(params)
+        if track_dir is not None:
+            seed_params['track_path'] = os.path.join(track_dir, 'seed'+str(seed))
+        tasks.append((seed, seed_params))
+
+    pool = multiprocessing.Pool(processes, init_worker, (grammar_file, target_file, is_RIP))
+    try:
+        # chunksize 1 so that long and short runs are spread evenly over the workers
+        rows = list(pool.imap(run_task, tasks, chunksize=1))
+    finally:
+        pool.close()
+        pool.join()
+    return rows
+
+# Write the rows of a results table as a CSV file:
+# one row per run, with the run information first and then one column per constraint.
+def write_table(rows, csv_path):
+    if len(rows) == 0:
+        raise ValueError("No results to write.")
+    columns = list(rows[0].keys())
+    csv_file = open(csv_path, 'w', newline='')
+    writer = csv.DictWriter(csv_file, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+    csv_file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run GLA learning with many seeds in parallel and write one table of results.")
+    parser.add_argument('grammar_file')
+    parser.add_argument('target_file')
+    parser.add_argument('num_seeds', type=int)
+    parser.add_argument('--rip', action='store_true', help="use RIP/OT-GLA (grammar_RIP)")
+    parser.add_argument('--batch', type=int, default=None, help="number of passes through the data (RIP only)")
+    parser.add_argument('--plasticity', type=float, default=1.0)
+    parser.add_argument('--noise-sigma', type=float, default=2.0)
+    parser.add_argument('--no-noise', action='store_true')
+    parser.add_argument('--init-value', type=float, default=100, help="initial ranking value of all constraints")
+    parser.add_argument('--eval-num', type=int, default=1000, help="number of evaluation samples per run")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--output', default='replications.csv')
+    parser.add_argument('--track-dir', default=None, help="folder to save the trajectories of each run in (for plot_pool.py)")
+    args = parser.parse_args()
+
+    rows = run_replications(args.grammar_file, args.target_file, args.num_seeds, args.rip, args.batch, args.plasticity, not args.no_noise, args.noise_sigma, args.init_value, args.eval_num, args.processes, args.track_dir)
+    write_table(rows, args.output)
+    print("Output file: "+args.output)
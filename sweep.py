@@ -0,0 +1,174 @@
+##### Parameter sweeps for the GLA
+# Runs learning simulations over a grid or a random sample of learner parameters
+# (plasticity, noise_sigma, noise_bool, batch, init_value) and seeds, in a pool of worker processes.
+# Each worker parses the grammar once (see replicate.py), not once per configuration.
+# Every completed configuration is appended to a results file (one JSON record per line) as soon as it is done,
+# and configurations that are already in the results file are skipped,
+# so an interrupted sweep can simply be restarted with the same command.
+#
+# Usage: python sweep.py grammar_file target_file sweep_file results_file [--rip] [--processes N]
+# The sweep file is a JSON object, e.g.
+#   {"type": "grid", "plasticity": [0.1, 1.0], "noise_sigma": [2.0], "seeds": 10}
+# or
+#   {"type": "random", "num_configs": 50, "plasticity": [0.01, 2.0], "noise_bool": [true, false], "seeds": 1}
+# In a grid sweep, every parameter is a list of values.
+# In a random sweep, a parameter given as [low, high] numbers is drawn uniformly from that range
+# (except batch, which is always chosen from its list), and any other list is chosen from.
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+
+import replicate
+
+# Default value of each swept parameter
+sweep_defaults = {'plasticity': 1.0, 'noise_sigma': 2.0, 'noise_bool': True, 'batch': None, 'init_value': 100}
+
+##### Defining sweeps ##########################################################
+
+# All combinations of the given parameter values, each with seeds 0, 1, ..., seeds-1
+def grid_sweep(plasticity=[1.0], noise_sigma=[2.0], noise_bool=[True], batch=[None], init_value=[100], seeds=1):
+    configs = []
+    for p in plasticity:
+        for s in noise_sigma:
+            for n in noise_bool:
+                for b in batch:
+                    for v in init_value:
+                        for seed in range(seeds):
+                            configs.append({'plasticity': p, 'noise_sigma': s, 'noise_bool': n, 'batch': b, 'init_value': v, 'seed': seed})
+    return configs
+
+# num_configs random parameter settings, each with seeds 0, 1, ..., seeds-1.
+# The settings are drawn with their own random generator seeded with sweep_seed,
+# so the same sweep (and thus the same configurations to skip) is produced on a restart.
+def random_sweep(num_configs, plasticity=[1.0], noise_sigma=[2.0], noise_bool=[True], batch=[None], init_value=[100], seeds=1, sweep_seed=0):
+    sweep_random = random.Random(sweep_seed)
+    ranges = {'plasticity': plasticity, 'noise_sigma': noise_sigma, 'noise_bool': noise_bool, 'batch': batch, 'init_value': init_value}
+    configs = []
+    for i in range(num_configs):
+        setting = {}
+        for param in ranges.keys():
+            values = ranges[param]
+            is_range = (param != 'batch' and len(values) == 2
+                        and all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in values))
+            if is_range:
+                setting[param] = sweep_random.uniform(values[0], values[1])
+            else:
+                setting[param] = sweep_random.choice(values)
+        for seed in range(seeds):
+            config = dict(setting)
+            config['seed'] = seed
+            configs.append(config)
+    return configs
+
+def read_sweep_file(sweep_file):
+    spec_file = open(sweep_file, 'r')
+    spec = json.load(spec_file)
+    spec_file.close()
+    sweep_type = spec.pop('type', 'grid')
+    if sweep_type == 'grid':
+        return grid_sweep(**spec)
+    elif sweep_type == 'random':
+        return random_sweep(**spec)
+    else:
+        raise ValueError("Unknown sweep type "+str(sweep_type)+". It should be 'grid' or 'random'.")
+
+##### Running sweeps ###########################################################
+
+# The key identifying a configuration in the results file
+def config_key(config):
+    key_config = {}
+    for param in sweep_defaults.keys():
+        key_config[param] = config.get(param, sweep_defaults[param])
+    key_config['seed'] = config['seed']
+    return json.dumps(key_config, sort_keys=True)
+
+# Keys of the configurations already recorded in the results file
+def completed_keys(results_path):
+    keys = set()
+    if not os.path.exists(results_path):
+        return keys
+    results_file = open(results_path, 'r')
+    for line in results_file:
+        line = line.strip()
+        if line:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A line cut off by an interruption; that configuration is run again
+                continue
+            keys.add(config_key(record['config']))
+    results_file.close()
+    return keys
+
+# A name for the files of a configuration, e.g. its trajectories
+def config_name(config):
+    parts = []
+    for param in sweep_defaults.keys():
+        parts.append(param+"_"+str(config.get(param, sweep_defaults[param])))
+    parts.append("seed_"+str(config['seed']))
+    return "-".join(parts)
+
+def run_config(config):
+    params = dict(sweep_defaults)
+    for param in sweep_defaults.keys():
+        if param in config:
+            params[param] = config[param]
+    params['eval_num'] = config['eval_num']
+    if config['track_dir'] is not None:
+        params['track_path'] = os.path.join(config['track_dir'], config_name(config))
+    row = replicate.run_one(config['seed'], params)
+    return (config, row)
+
+# Run all configurations not yet in results_path, appending a record for each one as it completes.
+# If track_dir is given, the trajectories of each configuration are saved there (see config_name), e.g. for plot_pool.py.
+# Returns the number of configurations run.
+def run_sweep(grammar_file, target_file, configs, results_path, is_RIP=False, eval_num=1000, processes=None, track_dir=None):
+    done = completed_keys(results_path)
+    todo = []
+    for config in configs:
+        if config_key(config) not in done:
+            config = dict(config)
+            config['eval_num'] = eval_num
+            config['track_dir'] = track_dir
+            todo.append(config)
+            # Skip duplicates within the sweep, too
+            done.add(config_key(config))
+    if len(todo) == 0:
+        return 0
+
+    if processes is None:
+        processes = os.cpu_count()
+    pool = multiprocessing.Pool(processes, replicate.init_worker, (grammar_file, target_file, is_RIP))
+    results_file = open(results_path, 'a')
+    try:
+        for config, row in pool.imap_unordered(run_config, todo, chunksize=1):
+            del config['eval_num']
+            del config['track_dir']
+            results_file.write(json.dumps({'config': config, 'result': row})+"\n")
+            results_file.flush()
+            os.fsync(results_file.fileno())
+    finally:
+        results_file.close()
+        pool.close()
+        pool.join()
+    return len(todo)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a (restartable) GLA parameter sweep over local worker processes.")
+    parser.add_argument('grammar_file')
+    parser.add_argument('target_file')
+    parser.add_argument('sweep_file', help="JSON file defining the sweep")
+    parser.add_argument('results_file', help="JSON-lines file the completed configurations are appended to")
+    parser.add_argument('--rip', action='store_true', help="use RIP/OT-GLA (grammar_RIP)")
+    parser.add_argument('--eval-num', type=int, default=1000, help="number of evaluation samples per run")
+    parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: number of cores)")
+    parser.add_argument('--track-dir', default=None, help="folder to save the trajectories of each configuration in (for plot_pool.py)")
+    args = parser.parse_args()
+
+    configs = read_sweep_file(args.sweep_file)
+    num_run = run_sweep(args.grammar_file, args.target_file, configs, args.results_file, args.rip, args.eval_num, args.processes, args.track_dir)
+    print(str(num_run)+" out of "+str(len(configs))+" configurations run; results in "+args.results_file)